@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from prometheus_client import Counter
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.api_clients.http import fan_out
+from app.api_clients.singleflight import single_flight
+from app.database import upsert_insert
+from app.models import ExternalCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# ======================================
+# ⏱️ Durées de vie par source (secondes)
+# ======================================
+# Une entrée est « fraîche » pendant son TTL, puis « périmée » pendant
+# CACHE_STALE_SECONDS : elle est encore servie immédiatement, et rafraîchie
+# en tâche de fond. Au-delà, l'appel redevient synchrone.
+CACHE_TTLS = {
+    "off_barcode": int(os.getenv("CACHE_TTL_OFF_BARCODE", str(7 * 24 * 3600))),
+    "off_search": int(os.getenv("CACHE_TTL_OFF_SEARCH", str(24 * 3600))),
+    "mealdb_search": int(os.getenv("CACHE_TTL_MEALDB_SEARCH", str(24 * 3600))),
+}
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "3600"))
+CACHE_STALE_SECONDS = int(os.getenv("CACHE_STALE_SECONDS", str(7 * 24 * 3600)))
+
+CACHE_REQUESTS = Counter(
+    "external_cache_requests_total",
+    "Lectures du cache des API externes, par source et résultat (hit, stale, miss, error)",
+    ["source", "result"],
+)
+
+# Rafraîchissements stale-while-revalidate, hors requête HTTP
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def normalize_key(key: str) -> str:
+    return " ".join(str(key).lower().split())
+
+
+def _age_seconds(fetched_at: datetime) -> float:
+    if fetched_at.tzinfo is None:  # SQLite ne conserve pas le fuseau
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - fetched_at).total_seconds()
+
+
+def _store(db: Session, source: str, key: str, value: Any):
+    _store_many(db, source, {key: value})
+
+
+def _store_many(db: Session, source: str, values: Dict[str, Any]):
+    """Un seul upsert pour toutes les clés (déjà normalisées), puis commit."""
+    now = datetime.now(timezone.utc)
+    stmt = upsert_insert(db, ExternalCache).values([
+        {"source": source, "key": key, "value": value, "fetched_at": now}
+        for key, value in values.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ExternalCache.source, ExternalCache.key],
+        set_={"value": stmt.excluded.value, "fetched_at": stmt.excluded.fetched_at},
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def _refresh(session_factory, source: str, key: str, fetch: Callable[[], Any]):
+    try:
+        value, shared = single_flight.do(source, key, fetch)
+        if shared:
+            return  # l'appel en cours a déjà été enregistré par son initiateur
+        db = session_factory()
+        try:
+            _store(db, source, key, value)
+        finally:
+            db.close()
+    except Exception as exc:
+        CACHE_REQUESTS.labels(source, "error").inc()
+        logger.warning("Rafraîchissement du cache %s/%s impossible : %s", source, key, exc)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard((source, key))
+
+
+def own_session(db: Session) -> sessionmaker:
+    """
+    Fabrique de sessions sur le même moteur que `db` : une Session ne se
+    partage pas entre threads (fan-out, rafraîchissements en tâche de fond).
+    """
+    return sessionmaker(bind=db.get_bind(), autoflush=False)
+
+
+def _schedule_refresh(db: Session, source: str, key: str, fetch: Callable[[], Any]):
+    with _refreshing_lock:
+        if (source, key) in _refreshing:
+            return
+        _refreshing.add((source, key))
+    _refresh_executor.submit(_refresh, own_session(db), source, key, fetch)
+
+
+# ======================================
+# 🗃️ Lecture avec cache
+# ======================================
+def cached_fetch(db: Session, source: str, key: str, fetch: Callable[[], Any], default: Any = None) -> Any:
+    """
+    Valeur de `fetch()` pour (source, clé normalisée), via la table external_cache.
+    `fetch` lève une exception en cas d'échec réseau : rien n'est alors mis
+    en cache et `default` est renvoyé (ou la valeur périmée si elle existe).
+    Une réponse « introuvable » (None, liste vide) est une valeur cacheable.
+    Les manques simultanés sur une même clé partagent un seul appel (single-flight).
+    """
+    key = normalize_key(key)
+    ttl = CACHE_TTLS.get(source, CACHE_DEFAULT_TTL)
+    entry = db.get(ExternalCache, (source, key))
+
+    if entry is not None:
+        age = _age_seconds(entry.fetched_at)
+        if age < ttl:
+            CACHE_REQUESTS.labels(source, "hit").inc()
+            return entry.value
+        if age < ttl + CACHE_STALE_SECONDS:
+            CACHE_REQUESTS.labels(source, "stale").inc()
+            _schedule_refresh(db, source, key, fetch)
+            return entry.value
+
+    CACHE_REQUESTS.labels(source, "miss").inc()
+    try:
+        # Appels simultanés pour la même clé : un seul part vers l'API
+        value, shared = single_flight.do(source, key, fetch)
+    except Exception as exc:
+        CACHE_REQUESTS.labels(source, "error").inc()
+        logger.warning("Appel %s/%s impossible : %s", source, key, exc)
+        return entry.value if entry is not None else default
+
+    if not shared:
+        try:
+            _store(db, source, key, value)
+        except SQLAlchemyError as exc:
+            # Le cache est une optimisation : la valeur obtenue est quand même renvoyée
+            db.rollback()
+            logger.warning("Écriture du cache %s/%s impossible : %s", source, key, exc)
+    return value
+
+
+# ======================================
+# 📚 Lecture avec cache, par lot
+# ======================================
+def cached_fetch_many(
+    db: Session,
+    source: str,
+    keys: Iterable[str],
+    fetch: Callable[[str], Any],
+    default: Any = None,
+    limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    `cached_fetch` pour plusieurs clés : {clé: valeur}.
+    - une seule lecture du cache, sur la session de la requête
+    - les manques partent en parallèle (au plus `limit` appels) : les threads
+      ne font que l'appel HTTP, sans session ; un échec ne touche que sa clé
+    - les valeurs obtenues sont écrites en un seul upsert
+    """
+    keys = list(dict.fromkeys(keys))
+    normalized = {key: normalize_key(key) for key in keys}
+    ttl = CACHE_TTLS.get(source, CACHE_DEFAULT_TTL)
+
+    entries = {
+        e.key: e
+        for e in db.query(ExternalCache).filter(
+            ExternalCache.source == source,
+            ExternalCache.key.in_(set(normalized.values())),
+        )
+    }
+
+    results = {}
+    missing = []
+    for key in keys:
+        entry = entries.get(normalized[key])
+        if entry is not None:
+            age = _age_seconds(entry.fetched_at)
+            if age < ttl:
+                CACHE_REQUESTS.labels(source, "hit").inc()
+                results[key] = entry.value
+                continue
+            if age < ttl + CACHE_STALE_SECONDS:
+                CACHE_REQUESTS.labels(source, "stale").inc()
+                _schedule_refresh(db, source, normalized[key], lambda key=key: fetch(key))
+                results[key] = entry.value
+                continue
+        CACHE_REQUESTS.labels(source, "miss").inc()
+        missing.append(key)
+
+    def call(key):
+        def run():
+            try:
+                return single_flight.do(source, normalized[key], lambda: fetch(key))
+            except Exception as exc:
+                CACHE_REQUESTS.labels(source, "error").inc()
+                logger.warning("Appel %s/%s impossible : %s", source, key, exc)
+                return None
+        return run
+
+    fetched = fan_out({key: call(key) for key in missing}, limit=limit)
+
+    to_store = {}
+    for key, outcome in fetched.items():
+        if outcome is None:
+            entry = entries.get(normalized[key])
+            results[key] = entry.value if entry is not None else default
+            continue
+        value, shared = outcome
+        results[key] = value
+        if not shared:
+            to_store[normalized[key]] = value
+
+    if to_store:
+        try:
+            _store_many(db, source, to_store)
+        except SQLAlchemyError as exc:
+            # Le cache est une optimisation : les valeurs obtenues sont quand même renvoyées
+            db.rollback()
+            logger.warning("Écriture du cache %s impossible : %s", source, exc)
+
+    return {key: results[key] for key in keys}
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# ======================================
+# 🌐 Client HTTP partagé (keep-alive + pool de connexions)
+# ======================================
+# Une seule Session par processus : les connexions TLS vers OpenFoodFacts,
+# TheMealDB, LibreTranslate... sont réutilisées d'un appel à l'autre.
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # hôtes distincts gardés en cache
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))          # connexions ouvertes par hôte
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "6"))                   # défaut si l'appel n'en donne pas
+HTTP_FANOUT_WORKERS = int(os.getenv("HTTP_FANOUT_WORKERS", "16"))
+
+
+class _Session(requests.Session):
+    """Session avec un timeout par défaut : aucun appel ne peut bloquer un worker indéfiniment."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    session = _Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        # Pool plein : on attend une connexion libre plutôt que d'en ouvrir une jetable
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "FoodWasteZero/1.0 (+https://foodwaste-zero.info)"
+    return session
+
+
+http_session = _build_session()
+
+# Appels sortants en parallèle (les routes sync tournent déjà dans le threadpool FastAPI)
+_fanout_executor = ThreadPoolExecutor(max_workers=HTTP_FANOUT_WORKERS, thread_name_prefix="http-fanout")
+
+
+def fan_out(calls: Dict[str, Callable[[], object]], limit: Optional[int] = None) -> Dict[str, object]:
+    """
+    Lance les appels en parallèle et retourne {nom: résultat}.
+    La latence totale est celle de l'appel le plus lent, pas la somme.
+    `limit` borne le nombre d'appels simultanés (fenêtre glissante).
+    Les fonctions appelées gèrent elles-mêmes leurs erreurs.
+    """
+    pending = iter(calls.items())
+    running = {}
+    results = {}
+    window = limit or len(calls)
+
+    for name, call in pending:
+        running[_fanout_executor.submit(call)] = name
+        if len(running) >= window:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    for future, name in running.items():
+        results[name] = future.result()
+    return {name: results[name] for name in calls}
@@ -0,0 +1,165 @@
+import argparse
+import csv
+import gzip
+import json
+import sys
+from typing import Dict, Iterator, List, Optional
+
+from prometheus_client import Counter
+from sqlalchemy.orm import Session
+
+from app.database import upsert_insert
+from app.models import OffProduct
+
+
+# Lignes envoyées par requête d'import (6 paramètres par ligne, < 65535)
+IMPORT_BATCH_SIZE = 5000
+INDEX_COLUMNS = ("name", "brand", "categories", "image_url", "nutriscore")
+NUTRISCORE_GRADES = ("a", "b", "c", "d", "e")
+
+INDEX_LOOKUPS = Counter(
+    "barcode_index_lookups_total",
+    "Recherches de code-barres dans l'index OpenFoodFacts local (hit / miss)",
+    ["result"],
+)
+
+
+# ======================================
+# 🔎 Lecture
+# ======================================
+def _candidates(code: str) -> List[str]:
+    # Un code UPC-A (12 chiffres) est aussi cherché sous sa forme EAN-13
+    return [code, code.zfill(13)] if code.isdigit() and len(code) < 13 else [code]
+
+
+def _as_product(row: OffProduct) -> dict:
+    return {
+        "name": row.name,
+        "brand": row.brand,
+        "category": row.categories,
+        "image": row.image_url,
+        "nutriscore": row.nutriscore,
+    }
+
+
+def lookup_many(db: Session, codes: List[str]) -> Dict[str, dict]:
+    """Fiches trouvées dans l'index local, {code demandé: fiche}, en une requête."""
+    wanted = {candidate: code for code in codes for candidate in _candidates(code)}
+    rows = db.query(OffProduct).filter(OffProduct.code.in_(list(wanted))).all() if wanted else []
+
+    found = {}
+    for row in rows:
+        found.setdefault(wanted[row.code], _as_product(row))
+    INDEX_LOOKUPS.labels("hit").inc(len(found))
+    INDEX_LOOKUPS.labels("miss").inc(len(codes) - len(found))
+    return found
+
+
+def lookup(db: Session, code: str) -> Optional[dict]:
+    """Fiche produit depuis l'index local (lecture par clé primaire), ou None."""
+    return lookup_many(db, [code]).get(code)
+
+
+# ======================================
+# 📥 Import de l'export OpenFoodFacts
+# ======================================
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def _to_row(record: dict) -> Optional[Dict]:
+    code = _clean(record.get("code"))
+    if not code:
+        return None
+    grade = (_clean(record.get("nutriscore_grade")) or "").lower()
+    return {
+        "code": code,
+        "name": _clean(record.get("product_name")),
+        "brand": _clean(record.get("brands")),
+        "categories": _clean(record.get("categories")),
+        "image_url": _clean(record.get("image_front_url") or record.get("image_url")),
+        # Grades a-e uniquement ("unknown", "not-applicable" → NULL)
+        "nutriscore": grade if grade in NUTRISCORE_GRADES else None,
+    }
+
+
+def iter_dump(path: str) -> Iterator[dict]:
+    """
+    Parcourt l'export ligne à ligne (mémoire constante) :
+    - JSONL (.jsonl / .jsonl.gz) : un produit JSON par ligne
+    - CSV (.csv / .csv.gz) : export tabulé officiel
+    """
+    with _open_text(path) as f:
+        if ".jsonl" in path:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = _to_row(json.loads(line))
+                except ValueError:
+                    continue
+                if row:
+                    yield row
+        else:
+            csv.field_size_limit(sys.maxsize)
+            for record in csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+                row = _to_row(record)
+                if row:
+                    yield row
+
+
+def _write_batch(db: Session, batch: Dict[str, dict]):
+    stmt = upsert_insert(db, OffProduct).values(list(batch.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OffProduct.code],
+        set_={c: getattr(stmt.excluded, c) for c in INDEX_COLUMNS},
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+def import_dump(db: Session, path: str, batch_size: int = IMPORT_BATCH_SIZE) -> int:
+    """
+    Importe (ou met à jour) l'index depuis un export local, par lots de
+    `batch_size` lignes validés un à un. Retourne le nombre de lignes lues.
+    """
+    total = 0
+    # Dict par code : un même code ne peut apparaître qu'une fois par INSERT ... ON CONFLICT
+    batch: Dict[str, dict] = {}
+    for row in iter_dump(path):
+        batch[row["code"]] = row
+        total += 1
+        if len(batch) >= batch_size:
+            _write_batch(db, batch)
+            batch = {}
+    if batch:
+        _write_batch(db, batch)
+    return total
+
+
+# ======================================
+# ▶️ Exécution directe
+# ======================================
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Index local des codes-barres OpenFoodFacts")
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("path", help="Export OpenFoodFacts (.jsonl[.gz] ou .csv[.gz])")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = import_dump(db, args.path, batch_size=args.batch_size)
+        print(f"✅ {rows} produits importés depuis {args.path}")
+    finally:
+        db.close()
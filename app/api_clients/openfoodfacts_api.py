@@ -1,4 +1,6 @@
-import requests
+from app.api_clients.cache import normalize_key
+from app.api_clients.http import http_session
+from app.api_clients.singleflight import single_flight
 from app.utils.translation import translate_text
 
 BASE_URL = "https://world.openfoodfacts.org"
@@ -8,14 +10,20 @@ def get_product_info(query: str):
     Récupère les informations produit depuis OpenFoodFacts.
     Si `query` est un code-barres → recherche directe
     Sinon → recherche par nom d’aliment (ex: yaourt)
+    Les appels simultanés pour la même requête partagent un seul appel.
     """
+    result, _ = single_flight.do("off_product_info", normalize_key(query), lambda: _get_product_info(query))
+    return result
+
+
+def _get_product_info(query: str):
     # Vérifie si c’est un code-barres numérique
     if query.isdigit():
         url = f"{BASE_URL}/api/v0/product/{query}.json"
     else:
         url = f"{BASE_URL}/cgi/search.pl?search_terms={query}&search_simple=1&action=process&json=true"
 
-    response = requests.get(url)
+    response = http_session.get(url)
     if response.status_code != 200:
         return {"error": "Erreur de requête OpenFoodFacts"}
 
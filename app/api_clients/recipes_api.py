@@ -1,4 +1,4 @@
-import requests
+from app.api_clients.http import http_session
 
 TRANSLATE_URL = "https://libretranslate.de/translate"
 BASE_URL = "https://www.themealdb.com/api/json/v1/1/filter.php"
@@ -9,7 +9,7 @@ def translate_to_english(text: str) -> str:
     """Traduit un texte français en anglais (pour requêtes TheMealDB)."""
     try:
         payload = {"q": text, "source": "fr", "target": "en", "format": "text"}
-        response = requests.post(TRANSLATE_URL, data=payload, timeout=5)
+        response = http_session.post(TRANSLATE_URL, data=payload, timeout=5)
         if response.status_code == 200:
             return response.json().get("translatedText", text)
         return text
@@ -21,7 +21,7 @@ def translate_to_french(text: str) -> str:
     """Traduit un texte anglais en français (pour affichage)."""
     try:
         payload = {"q": text, "source": "en", "target": "fr", "format": "text"}
-        response = requests.post(TRANSLATE_URL, data=payload, timeout=5)
+        response = http_session.post(TRANSLATE_URL, data=payload, timeout=5)
         if response.status_code == 200:
             return response.json().get("translatedText", text)
         return text
@@ -36,7 +36,7 @@ def get_recipes_by_ingredient(ingredient: str):
     """
     try:
         ingredient_en = translate_to_english(ingredient)
-        response = requests.get(BASE_URL, params={"i": ingredient_en}, timeout=5)
+        response = http_session.get(BASE_URL, params={"i": ingredient_en}, timeout=5)
         if response.status_code != 200:
             return []
 
@@ -65,7 +65,7 @@ def get_recipe_details(recipe_id: str):
     Récupère les détails complets d’une recette à partir de son ID (TheMealDB).
     """
     try:
-        response = requests.get(DETAIL_URL, params={"i": recipe_id}, timeout=5)
+        response = http_session.get(DETAIL_URL, params={"i": recipe_id}, timeout=5)
         if response.status_code != 200:
             return {"error": "Erreur API TheMealDB"}
 
@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Tuple
+
+from prometheus_client import Counter
+
+
+SINGLEFLIGHT_CALLS = Counter(
+    "external_singleflight_calls_total",
+    "Appels externes par source : exécutés (leader) ou fusionnés avec un appel en cours (coalesced)",
+    ["source", "result"],
+)
+
+
+class SingleFlight:
+    """
+    Fusion des appels identiques simultanés : le premier appel pour une clé
+    est exécuté, les suivants attendent son résultat (ou son exception) au
+    lieu de solliciter à nouveau l'API. Rien n'est conservé après la fin de
+    l'appel : c'est le rôle du cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(self, source: str, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Retourne (résultat, partagé) ; `partagé` vaut True pour un appel fusionné."""
+        with self._lock:
+            future = self._in_flight.get((source, key))
+            leader = future is None
+            if leader:
+                future = self._in_flight[(source, key)] = Future()
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.labels(source, "coalesced").inc()
+            return future.result(), True
+
+        SINGLEFLIGHT_CALLS.labels(source, "leader").inc()
+        try:
+            future.set_result(fn())
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._in_flight[(source, key)]
+        return future.result(), False
+
+
+single_flight = SingleFlight()
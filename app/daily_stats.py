@@ -0,0 +1,143 @@
+import argparse
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session
+
+from .models import Product, DailyStats, DailyCategoryStats, DailyUserStats
+from .ml.predictor import expired_clause, at_risk_clause
+from .rollups import sql_day
+
+
+BUCKETS = ("total_products", "expired", "risky", "safe")
+
+
+# ======================================
+# 🧮 Comptage en une requête
+# ======================================
+def _count_rows(db: Session, day: date):
+    """
+    Une seule requête SUM(CASE ...) groupée par (utilisateur, catégorie) :
+    le nombre de lignes lues en Python est celui des couples, pas des produits.
+    Pour un jour passé, seuls les produits déjà créés ce jour-là sont comptés
+    (les produits supprimés depuis ne peuvent pas être reconstitués).
+    """
+    expired = expired_clause(day)
+    risky = at_risk_clause(day)
+
+    query = db.query(
+        Product.user_id,
+        Product.category_id,
+        func.count(Product.id),
+        func.sum(case((expired, 1), else_=0)),
+        func.sum(case((risky, 1), else_=0)),
+        # Sans date d'expiration ou hors des deux cas : sûr (comme avant)
+        func.sum(case((or_(expired, risky), 0), else_=1)),
+    ).group_by(Product.user_id, Product.category_id)
+
+    if day < date.today():
+        query = query.filter(or_(
+            Product.created_at.is_(None),
+            sql_day(db, Product.created_at) <= day,
+        ))
+    return query.all()
+
+
+def compute_daily_stats(db: Session, day: date) -> dict:
+    """Totaux globaux + ventilations par catégorie et par utilisateur pour `day`."""
+    by_category = defaultdict(lambda: [0, 0, 0, 0])
+    by_user = defaultdict(lambda: [0, 0, 0, 0])
+    overall = [0, 0, 0, 0]
+
+    for user_id, category_id, *counts in _count_rows(db, day):
+        for target in (overall, by_category[category_id], by_user[user_id]):
+            for i, value in enumerate(counts):
+                target[i] += int(value or 0)
+
+    return {
+        "overall": dict(zip(BUCKETS, overall)),
+        "by_category": {k: dict(zip(BUCKETS, v)) for k, v in by_category.items()},
+        "by_user": {k: dict(zip(BUCKETS, v)) for k, v in by_user.items()},
+    }
+
+
+# ======================================
+# 💾 Écriture (idempotente par jour)
+# ======================================
+def record_daily_stats(db: Session, day: Optional[date] = None) -> dict:
+    """
+    Calcule et (ré)écrit les statistiques du jour : la ligne globale
+    daily_stats et les ventilations daily_category_stats / daily_user_stats.
+    Les lignes existantes du jour sont remplacées. Un commit par jour.
+    """
+    day = day or date.today()
+    stats = compute_daily_stats(db, day)
+    overall = stats["overall"]
+
+    existing = db.query(DailyStats).filter(DailyStats.stat_date == day).first()
+    if existing:
+        for key, value in overall.items():
+            setattr(existing, key, value)
+    else:
+        db.add(DailyStats(stat_date=day, **overall))
+
+    db.query(DailyCategoryStats).filter(DailyCategoryStats.stat_date == day).delete(synchronize_session=False)
+    db.query(DailyUserStats).filter(DailyUserStats.stat_date == day).delete(synchronize_session=False)
+
+    db.bulk_insert_mappings(DailyCategoryStats, [
+        {"stat_date": day, "category_id": category_id, **counts}
+        for category_id, counts in stats["by_category"].items()
+    ])
+    db.bulk_insert_mappings(DailyUserStats, [
+        {"stat_date": day, "user_id": user_id, **counts}
+        for user_id, counts in stats["by_user"].items()
+    ])
+    db.commit()
+
+    return {
+        "stat_date": day.isoformat(),
+        "expired": overall["expired"],
+        "risky": overall["risky"],
+        "safe": overall["safe"],
+        "total": overall["total_products"],
+        "categories": len(stats["by_category"]),
+        "users": len(stats["by_user"]),
+    }
+
+
+def backfill_daily_stats(db: Session, since: date, until: Optional[date] = None) -> list:
+    """Régénère les statistiques jour par jour sur [since, until]."""
+    until = until or date.today()
+    results = []
+    day = since
+    while day <= until:
+        results.append(record_daily_stats(db, day))
+        day += timedelta(days=1)
+    return results
+
+
+# ======================================
+# ▶️ Exécution directe
+# ======================================
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Statistiques journalières (global / catégorie / utilisateur)")
+    parser.add_argument("command", choices=["record", "backfill"])
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "backfill":
+            if not args.since:
+                parser.error("--since est obligatoire pour backfill")
+            for row in backfill_daily_stats(db, args.since, args.until):
+                print(row)
+        else:
+            print(record_daily_stats(db, args.until))
+    finally:
+        db.close()
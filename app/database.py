@@ -1,5 +1,6 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg://fwz:fwz_password@db:5433/foodwaste")
@@ -19,3 +20,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def upsert_insert(db: Session, model):
+    """INSERT du dialecte courant (supporte on_conflict_do_update)."""
+    dialect = db.get_bind().dialect.name
+    return (postgresql.insert if dialect == "postgresql" else sqlite.insert)(model)
@@ -0,0 +1,188 @@
+import argparse
+import os
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Date, column, func, literal, select, table, text
+from sqlalchemy.orm import Session
+
+from .migrations import (
+    HISTORY_DEFAULT_PARTITION,
+    HISTORY_TABLE,
+    add_months,
+    ensure_history_partitions,
+    history_partitions,
+    month_start,
+    schema_lock,
+)
+from .models import ConsumptionHistory, ConsumptionHistoryMonthly
+from .database import upsert_insert
+from .rollups import ROLLUP_COUNTERS, sql_day
+
+
+# Mois d'historique brut conservés (le mois courant inclus) avant compactage
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "24"))
+# Attente maximale du verrou de la table parente pour détacher une partition :
+# au-delà on abandonne plutôt que de bloquer les lectures / écritures en file
+HISTORY_DETACH_LOCK_TIMEOUT = os.getenv("HISTORY_DETACH_LOCK_TIMEOUT", "5s")
+
+
+# ======================================
+# 📦 Compactage d'un mois
+# ======================================
+def _compact_month(db: Session, month: date, table_name: Optional[str] = None) -> int:
+    """
+    Ajoute à l'archive les totaux (utilisateur, mois) des lignes brutes du
+    mois, en une requête INSERT ... SELECT ... GROUP BY user_id.
+    `table_name` : partition détachée à lire à la place de consumption_history.
+    """
+    history = (
+        table(table_name, column("id"), column("user_id"), column("action"), column("amount"), column("created_at"))
+        if table_name else ConsumptionHistory.__table__
+    )
+    consumed = history.c.action == "consumed"
+    wasted = history.c.action == "wasted"
+    source = (
+        select(
+            history.c.user_id,
+            literal(month, Date),
+            func.count(history.c.id).filter(consumed),
+            func.count(history.c.id).filter(wasted),
+            func.coalesce(func.sum(history.c.amount).filter(consumed), 0),
+            func.coalesce(func.sum(history.c.amount).filter(wasted), 0),
+        )
+        .where(
+            history.c.created_at >= month,
+            history.c.created_at < add_months(month, 1),
+        )
+        .group_by(history.c.user_id)
+    )
+
+    stmt = upsert_insert(db, ConsumptionHistoryMonthly).from_select(
+        ["user_id", "month", *ROLLUP_COUNTERS], source
+    )
+    # Cumul : un mois peut être compacté en plusieurs fois (hors partitions)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ConsumptionHistoryMonthly.user_id, ConsumptionHistoryMonthly.month],
+        set_={
+            c: getattr(ConsumptionHistoryMonthly, c) + getattr(stmt.excluded, c)
+            for c in ROLLUP_COUNTERS
+        },
+    )
+    return db.execute(stmt).rowcount
+
+
+# ======================================
+# 🔌 Détachement des partitions (PostgreSQL)
+# ======================================
+def _detach_partition(db: Session, name: str):
+    """
+    DETACH dans sa propre transaction courte : le verrou ACCESS EXCLUSIVE
+    sur la table parente ne dure que le détachement (pas de parcours), et
+    jamais pendant le compactage ni le DROP. (DETACH ... CONCURRENTLY est
+    refusé tant qu'une partition DEFAULT existe.)
+    """
+    schema_lock(db.connection())
+    db.execute(text(f"SET LOCAL lock_timeout = '{HISTORY_DETACH_LOCK_TIMEOUT}'"))
+    db.execute(text(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {name}"))
+    db.commit()
+
+
+def _detached_partitions(db: Session) -> List[Tuple[str, date]]:
+    """Partitions mensuelles détachées mais pas encore supprimées (archivage interrompu)."""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_class c "
+        "WHERE c.relkind = 'r' AND c.relname ~ :pattern AND NOT c.relispartition"
+    ), {"pattern": rf"^{HISTORY_TABLE}_\d{{4}}_\d{{2}}$"}).scalars()
+    parts = []
+    for name in names:
+        year, month = name[len(HISTORY_TABLE) + 1:].split("_")
+        parts.append((name, date(int(year), int(month), 1)))
+    return sorted(parts, key=lambda p: p[1])
+
+
+# ======================================
+# 🗄️ Archivage
+# ======================================
+def archive_history(
+    db: Session,
+    retention_months: int = HISTORY_RETENTION_MONTHS,
+    today: Optional[date] = None,
+) -> dict:
+    """
+    Compacte l'historique plus ancien que `retention_months` mois en totaux
+    mensuels par utilisateur, puis supprime les lignes brutes :
+    - PostgreSQL : partition par partition, détachée dans une transaction
+      courte puis compactée et supprimée (DROP TABLE, pas de DELETE ni de
+      VACUUM), puis les lignes anciennes tombées dans la partition DEFAULT
+    - autres bases : DELETE des lignes du mois
+    Un commit par mois (compactage + suppression) : une interruption ne perd
+    ni ne double aucun mois ; une partition détachée non supprimée est
+    reprise au passage suivant.
+    Les totaux journaliers (user_daily_rollup) ne sont pas touchés.
+    """
+    cutoff = add_months(month_start(today or date.today()), -(retention_months - 1))
+    postgres = db.get_bind().dialect.name == "postgresql"
+
+    if postgres:
+        detached = [(name, m) for name, m in _detached_partitions(db) if m < cutoff]
+        for name, month in history_partitions(db.connection()):
+            if month < cutoff:
+                _detach_partition(db, name)
+                detached.append((name, month))
+        partitions = sorted(detached, key=lambda p: p[1])
+        stranded = db.execute(text(
+            f"SELECT DISTINCT date_trunc('month', created_at)::date FROM {HISTORY_DEFAULT_PARTITION} "
+            "WHERE created_at < :cutoff"
+        ), {"cutoff": cutoff}).scalars()
+        # Pas de partition à supprimer : DELETE des lignes du mois (dans DEFAULT)
+        partitions += [(None, m) for m in sorted(stranded)]
+    else:
+        oldest = db.query(func.min(sql_day(db, ConsumptionHistory.created_at))).scalar()
+        partitions = []
+        if oldest:
+            month = month_start(oldest if isinstance(oldest, date) else date.fromisoformat(str(oldest)[:10]))
+            while month < cutoff:
+                partitions.append((None, month))
+                month = add_months(month, 1)
+
+    archived = []
+    for name, month in partitions:
+        if name:
+            # Partition déjà détachée : ni la table parente ni ses index ne sont verrouillés
+            schema_lock(db.connection())
+            users = _compact_month(db, month, table_name=name)
+            db.execute(text(f"DROP TABLE {name}"))
+        else:
+            users = _compact_month(db, month)
+            db.query(ConsumptionHistory).filter(
+                ConsumptionHistory.created_at >= month,
+                ConsumptionHistory.created_at < add_months(month, 1),
+            ).delete(synchronize_session=False)
+        db.commit()
+        archived.append({"month": month.isoformat(), "users": users})
+
+    if postgres:
+        schema_lock(db.connection())
+        ensure_history_partitions(db.connection())
+        db.commit()
+
+    return {"cutoff": cutoff.isoformat(), "archived": archived}
+
+
+# ======================================
+# ▶️ Exécution directe
+# ======================================
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archivage de consumption_history")
+    parser.add_argument("--retention-months", type=int, default=HISTORY_RETENTION_MONTHS)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = archive_history(db, retention_months=args.retention_months)
+        print(f"✅ {len(result['archived'])} mois archivés (avant {result['cutoff']})")
+    finally:
+        db.close()
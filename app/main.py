@@ -3,6 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .database import Base, engine
 from . import models
+from .migrations import start_partition_maintenance, upgrade_schema
+from .ml.registry import model_registry
 from .routers import users, products, stats, admin, alerts, history, categories, external_data,barcode
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -36,6 +38,11 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    # Partitions d'historique des mois à venir, sans dépendre d'un redémarrage
+    start_partition_maintenance(engine)
+    # Chargement du modèle ML une fois par worker, avant la première requête
+    model_registry.get()
 
 # ======================================
 # 🔥 Routes API
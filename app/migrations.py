@@ -0,0 +1,316 @@
+import argparse
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+
+logger = logging.getLogger(__name__)
+
+# ======================================
+# 🔧 Mises à jour de schéma idempotentes
+# ======================================
+# `Base.metadata.create_all` crée les tables manquantes mais ne modifie
+# jamais une table existante : les colonnes / index ajoutés depuis sont
+# appliqués ici au démarrage (PostgreSQL uniquement, rejouables sans risque).
+POSTGRES_UPGRADES = [
+    # Statut par dates (at_risk_from)
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS at_risk_from DATE",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS risk_model_version VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_products_user_at_risk_from ON products (user_id, at_risk_from)",
+    # Alertes par fenêtre d'expiration
+    "CREATE INDEX IF NOT EXISTS ix_products_user_expiration ON products (user_id, expiration_date)",
+    # Filtre admin par préfixe d'email (LIKE 'abc%' indexable)
+    "CREATE INDEX IF NOT EXISTS ix_users_email_prefix ON users (email varchar_pattern_ops)",
+    # Copie du nom de produit / catégorie dans l'historique
+    "ALTER TABLE consumption_history ADD COLUMN IF NOT EXISTS product_name VARCHAR",
+    "ALTER TABLE consumption_history ADD COLUMN IF NOT EXISTS category_name VARCHAR",
+    # Features d'entraînement copiées dans l'historique
+    "ALTER TABLE consumption_history ADD COLUMN IF NOT EXISTS product_quantity NUMERIC",
+    "ALTER TABLE consumption_history ADD COLUMN IF NOT EXISTS product_expiration_date DATE",
+]
+
+
+HISTORY_TABLE = "consumption_history"
+# Reçoit les lignes hors de toute partition mensuelle (horloge décalée, mois
+# pas encore créé) au lieu de faire échouer l'INSERT
+HISTORY_DEFAULT_PARTITION = f"{HISTORY_TABLE}_default"
+# Partitions mensuelles créées à l'avance (démarrage, tâche périodique, archivage)
+HISTORY_PARTITION_MONTHS_AHEAD = int(os.getenv("HISTORY_PARTITION_MONTHS_AHEAD", "3"))
+# Période de la vérification des partitions à venir, dans chaque worker
+HISTORY_PARTITION_CHECK_SECONDS = int(os.getenv("HISTORY_PARTITION_CHECK_SECONDS", str(6 * 3600)))
+
+# Index créés sur la table partitionnée (propagés à chaque partition)
+HISTORY_INDEXES = [
+    # Historique d'un utilisateur par date (pagination, stats)
+    f"CREATE INDEX IF NOT EXISTS ix_consumption_history_user_created ON {HISTORY_TABLE} (user_id, created_at)",
+    # Balayages par période : quelques pages d'index pour des lignes insérées dans l'ordre
+    f"CREATE INDEX IF NOT EXISTS ix_consumption_history_created_brin ON {HISTORY_TABLE} USING brin (created_at)",
+]
+
+
+# Verrou consultatif partagé par tout le DDL (workers au démarrage, commandes) :
+# un seul à la fois, les autres attendent puis rejouent des no-op
+SCHEMA_LOCK_KEY = 7_240_115
+
+
+def schema_lock(conn: Connection):
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
+
+def upgrade_schema(engine: Engine):
+    """DDL idempotent uniquement : rien de long ni de destructif au démarrage."""
+    if engine.dialect.name != "postgresql":
+        return
+
+    with engine.begin() as conn:
+        schema_lock(conn)
+        for stmt in POSTGRES_UPGRADES:
+            conn.execute(text(stmt))
+        if _relkind(conn, HISTORY_TABLE) == "p":
+            ensure_history_partitions(conn)
+            for stmt in HISTORY_INDEXES:
+                conn.execute(text(stmt))
+        else:
+            logger.warning(
+                "%s n'est pas partitionnée : lancer `python -m app.migrations partition-history`",
+                HISTORY_TABLE,
+            )
+
+
+# ======================================
+# 🗂️ Partitionnement mensuel de consumption_history
+# ======================================
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, n: int) -> date:
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{HISTORY_TABLE}_{month:%Y_%m}"
+
+
+def _relkind(conn: Connection, name: str) -> Optional[str]:
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": name},
+    ).scalar()
+
+
+def history_partitions(conn: Connection) -> List[Tuple[str, date]]:
+    """Partitions mensuelles existantes, triées : [(nom, 1er jour du mois)]."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        f"WHERE i.inhparent = '{HISTORY_TABLE}'::regclass"
+    )).scalars()
+    pattern = re.compile(rf"^{HISTORY_TABLE}_(\d{{4}})_(\d{{2}})$")
+    parts = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            parts.append((name, date(int(match[1]), int(match[2]), 1)))
+    return sorted(parts, key=lambda p: p[1])
+
+
+def ensure_history_partitions(
+    conn: Connection,
+    since: Optional[date] = None,
+    months_ahead: int = HISTORY_PARTITION_MONTHS_AHEAD,
+):
+    """
+    Crée la partition DEFAULT et les partitions mensuelles manquantes du mois
+    `since` (défaut : courant) à +months_ahead. Les lignes déjà tombées dans
+    DEFAULT pour un mois manquant y sont déplacées avant de l'attacher.
+    """
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {HISTORY_DEFAULT_PARTITION} PARTITION OF {HISTORY_TABLE} DEFAULT"
+    ))
+    existing = {m for _, m in history_partitions(conn)}
+
+    current = month_start(date.today())
+    month = month_start(since) if since else current
+    last = add_months(current, months_ahead)
+    while month <= last:
+        nxt = add_months(month, 1)
+        if month not in existing:
+            _create_month_partition(conn, month, nxt)
+        month = nxt
+
+
+def _create_month_partition(conn: Connection, month: date, nxt: date):
+    name = partition_name(month)
+    bounds = f"FOR VALUES FROM ('{month}') TO ('{nxt}')"
+    in_range = f"created_at >= '{month}' AND created_at < '{nxt}'"
+
+    stranded = conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {HISTORY_DEFAULT_PARTITION} WHERE {in_range})"
+    )).scalar()
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {HISTORY_TABLE} {bounds}"))
+        return
+
+    # PARTITION OF échouerait (lignes du mois dans DEFAULT) : table à part, déplacement, puis ATTACH
+    conn.execute(text(
+        f"CREATE TABLE {name} (LIKE {HISTORY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {HISTORY_DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ))
+    conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} ATTACH PARTITION {name} {bounds}"))
+
+
+def maintain_history_partitions(engine: Engine):
+    """Crée les partitions à venir sous le verrou de schéma (no-op hors table partitionnée)."""
+    with engine.begin() as conn:
+        schema_lock(conn)
+        if _relkind(conn, HISTORY_TABLE) == "p":
+            ensure_history_partitions(conn)
+
+
+_maintenance_started = False
+_maintenance_lock = threading.Lock()
+
+
+def start_partition_maintenance(engine: Engine, interval: int = HISTORY_PARTITION_CHECK_SECONDS):
+    """
+    Vérifie périodiquement les partitions à venir, dans un thread démon :
+    le mois suivant existe même sans redémarrage ni archivage.
+    Un seul thread par process.
+    """
+    global _maintenance_started
+    if engine.dialect.name != "postgresql" or interval <= 0:
+        return
+
+    with _maintenance_lock:
+        if _maintenance_started:
+            return
+        _maintenance_started = True
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                maintain_history_partitions(engine)
+            except Exception as exc:
+                logger.warning("Maintenance des partitions %s impossible : %s", HISTORY_TABLE, exc)
+
+    threading.Thread(target=loop, name="history-partitions", daemon=True).start()
+
+
+def partition_history(engine: Engine) -> bool:
+    """
+    Conversion ponctuelle de l'ancienne consumption_history en table
+    partitionnée par mois (commande explicite, jamais au démarrage) :
+    l'ancienne table est renommée, les lignes recopiées dans la table
+    partitionnée puis l'ancienne supprimée, le tout dans une transaction.
+    Une nouvelle base est déjà partitionnée par create_all : no-op.
+    Retourne True si une conversion a eu lieu.
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+
+    with engine.begin() as conn:
+        schema_lock(conn)
+        converted = _relkind(conn, HISTORY_TABLE) == "r"
+        if converted:
+            legacy = f"{HISTORY_TABLE}_unpartitioned"
+            conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} RENAME TO {legacy}"))
+            # Noms d'index / contraintes globaux au schéma : libérés pour la nouvelle table
+            conn.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {HISTORY_TABLE}_pkey TO {legacy}_pkey"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_consumption_history_user_created"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_consumption_history_created_brin"))
+
+            conn.execute(text(
+                f"CREATE TABLE {HISTORY_TABLE} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+                "PARTITION BY RANGE (created_at)"
+            ))
+            conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} ALTER COLUMN created_at SET NOT NULL"))
+            conn.execute(text(f"ALTER TABLE {HISTORY_TABLE} ADD PRIMARY KEY (id, created_at)"))
+            conn.execute(text(
+                f"ALTER TABLE {HISTORY_TABLE} ADD FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"
+            ))
+            conn.execute(text(
+                f"ALTER TABLE {HISTORY_TABLE} ADD FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE SET NULL"
+            ))
+
+            oldest = conn.execute(text(f"SELECT min(created_at)::date FROM {legacy}")).scalar()
+            ensure_history_partitions(conn, since=oldest or date.today())
+
+            conn.execute(text(f"UPDATE {legacy} SET created_at = now() WHERE created_at IS NULL"))
+            conn.execute(text(f"INSERT INTO {HISTORY_TABLE} SELECT * FROM {legacy}"))
+            conn.execute(text(f"DROP TABLE {legacy}"))
+
+        ensure_history_partitions(conn)
+        for stmt in HISTORY_INDEXES:
+            conn.execute(text(stmt))
+    return converted
+
+
+# ======================================
+# 🧾 Reprise ponctuelle des noms dans l'historique
+# ======================================
+# Pas au démarrage : le balayage `product_name IS NULL` relirait tout
+# l'historique à chaque boot. Lancé une fois après le déploiement :
+#   python -m app.migrations backfill-history-names
+# D'ici là, /history lit le nom sur le produit encore existant (jointure
+# limitée aux lignes sans copie) : la reprise ne fait que figer ces noms.
+HISTORY_BACKFILL_BATCH = int(os.getenv("HISTORY_BACKFILL_BATCH", "5000"))
+
+
+def backfill_history_names(engine: Engine, batch_size: int = HISTORY_BACKFILL_BATCH) -> int:
+    """
+    Copie nom de produit / catégorie dans les lignes d'historique antérieures
+    à la copie et dont le produit existe encore, par lots (un commit par lot,
+    verrous courts). Retourne le nombre de lignes mises à jour.
+    """
+    if engine.dialect.name != "postgresql":
+        return 0
+
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            updated = conn.execute(text(f"""
+                UPDATE {HISTORY_TABLE} h
+                SET product_name = p.name, category_name = c.name
+                FROM products p LEFT JOIN categories c ON c.id = p.category_id
+                WHERE h.product_id = p.id
+                  AND (h.id, h.created_at) IN (
+                    SELECT b.id, b.created_at FROM {HISTORY_TABLE} b
+                    JOIN products bp ON bp.id = b.product_id
+                    WHERE b.product_name IS NULL
+                    LIMIT :batch_size
+                  )
+            """), {"batch_size": batch_size}).rowcount
+        total += updated
+        if updated < batch_size:
+            return total
+
+
+# ======================================
+# ▶️ Exécution directe
+# ======================================
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Opérations de schéma ponctuelles")
+    parser.add_argument("command", choices=["partition-history", "backfill-history-names"])
+    parser.add_argument("--batch-size", type=int, default=HISTORY_BACKFILL_BATCH)
+    args = parser.parse_args()
+
+    if args.command == "partition-history":
+        converted = partition_history(engine)
+        print("✅ consumption_history partitionnée" if converted else "✅ déjà partitionnée")
+    else:
+        rows = backfill_history_names(engine, batch_size=args.batch_size)
+        print(f"✅ {rows} lignes d'historique complétées")
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+
+
+TREE_LEAF = -1
+
+# Tableaux persistés par `save` (un .npy chacun, chargeables en mmap)
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes")
+
+# Nombre max de couples (ligne, arbre) descendus en même temps (borne la mémoire)
+BLOCK_CELLS = 1 << 20
+
+
+class CompiledForest:
+    """
+    Forêt aléatoire sklearn « aplatie » en tableaux NumPy contigus :
+    tous les nœuds de tous les arbres sont concaténés (feature, threshold,
+    left, right, value) et `roots` donne l'indice du premier nœud de chaque arbre.
+
+    L'évaluation descend tous les arbres pour toutes les lignes en même temps,
+    sans la validation d'entrée ni le dispatch joblib de `model.predict`.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.classes = np.asarray(classes)
+        self.max_depth = int(max_depth)
+
+    # ----------------------------
+    # Construction
+    # ----------------------------
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledForest":
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for est in model.estimators_:
+            t = est.tree_
+            if t.n_outputs != 1:
+                raise ValueError("Seuls les modèles mono-sortie sont supportés")
+
+            left = t.children_left.astype(np.intp)
+            right = t.children_right.astype(np.intp)
+            is_leaf = left == TREE_LEAF
+
+            # Indices globaux ; une feuille pointe sur elle-même pour que la
+            # descente puisse continuer sans branche particulière
+            node_ids = np.arange(t.node_count, dtype=np.intp) + offset
+            left = np.where(is_leaf, node_ids, left + offset)
+            right = np.where(is_leaf, node_ids, right + offset)
+
+            # Probabilités de classe par feuille (normalisées comme predict_proba)
+            value = t.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+
+            features.append(np.where(is_leaf, 0, t.feature))
+            thresholds.append(t.threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value / totals)
+            roots.append(offset)
+
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.asarray(roots),
+            classes=model.classes_,
+            max_depth=max_depth,
+        )
+
+    # ----------------------------
+    # Persistance (.npy memory-mappables)
+    # ----------------------------
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        np.save(os.path.join(directory, "max_depth.npy"), np.asarray(self.max_depth))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = "r") -> "CompiledForest":
+        """
+        Avec mmap_mode="r", les tableaux restent dans le cache de pages de l'OS
+        et sont partagés entre tous les workers qui ouvrent le même fichier.
+        """
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAYS
+        }
+        max_depth = int(np.load(os.path.join(directory, "max_depth.npy")))
+        return cls(max_depth=max_depth, **arrays)
+
+    # ----------------------------
+    # Évaluation
+    # ----------------------------
+    def predict_proba(self, X) -> np.ndarray:
+        # sklearn compare des entrées float32 à des seuils float64
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        block = max(1, BLOCK_CELLS // len(self.roots))
+        if X.shape[0] <= block:
+            return self._predict_block(X)
+        return np.concatenate([
+            self._predict_block(X[i:i + block]) for i in range(0, X.shape[0], block)
+        ])
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        nodes = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=1)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
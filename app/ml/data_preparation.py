@@ -1,83 +1,138 @@
-import pandas as pd
-from sqlalchemy.orm import Session
-from datetime import datetime, date
-from app.models import Product
-from app.ml.model import model  # ⚠️ adapte le chemin si besoin
+import json
+import os
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
 
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
 
-# ================================
-# 1️⃣ Chargement des données (training)
-# ================================
-def load_data_from_db(db: Session):
-    products = db.query(Product).all()
-    if not products:
-        return pd.DataFrame()
-
-    data = [
-        {
-            "quantity": float(p.quantity),
-            "expiration_date": p.expiration_date,
-        }
-        for p in products
-    ]
-
-    return pd.DataFrame(data)
-
-
-# ================================
-# 2️⃣ Préprocessing (training)
-# ================================
-def preprocess_data(df: pd.DataFrame):
-    if df.empty:
-        return df
+from app.models import ConsumptionHistory
 
-    df["expiration_date"] = pd.to_datetime(df["expiration_date"], errors="coerce")
-    df["days_to_expire"] = (df["expiration_date"] - datetime.now()).dt.days
 
-    def get_status(days):
-        if pd.isna(days):
-            return 0          # inconnu
-        elif days < 0:
-            return 1          # périmé
-        elif days <= 3:
-            return 1          # bientôt périmé
-        else:
-            return 0          # frais
+BASE_DIR = os.path.dirname(__file__)
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "data", "snapshots")
 
-    df["target"] = df["days_to_expire"].apply(get_status)
+TRAINING_CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "50000"))
 
-    # 🔹 Colonnes utilisées par le modèle
-    return df[["quantity", "days_to_expire", "target"]]
+# Ordre des colonnes de X : identique aux features de l'API
+FEATURES = ["quantity", "days_to_expire"]
 
 
 # ================================
-# 3️⃣ PRÉDICTION (production)
+# 1️⃣ Lecture en streaming (training)
 # ================================
-def get_prediction_and_message(product):
+def iter_training_chunks(engine: Engine, chunk_size: int = TRAINING_CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
     """
-    ⚠️ CETTE FONCTION MANQUAIT
-    Elle est appelée par /products/predict
+    Parcourt l'historique de consommation avec un curseur côté serveur et
+    produit des blocs (X, y) NumPy, avec les mêmes features qu'à l'inférence :
+    - quantity       = quantité du produit détenue au moment de l'action
+    - days_to_expire = jours restants avant péremption au moment de l'action
+    - y              = 1 si gaspillé, 0 si consommé (vrai label, pas simulé)
+
+    Les features sont lues dans les copies faites à l'écriture de
+    l'historique : pas de jointure, et les actions qui ont vidé (donc
+    supprimé) un produit sont conservées. Les lignes antérieures à ces
+    copies sont ignorées. Aucun objet ORM n'est créé.
     """
+    stmt = (
+        select(
+            ConsumptionHistory.product_quantity,
+            ConsumptionHistory.product_expiration_date,
+            ConsumptionHistory.created_at,
+            ConsumptionHistory.action,
+        )
+        .where(
+            ConsumptionHistory.product_quantity.is_not(None),
+            ConsumptionHistory.product_expiration_date.is_not(None),
+        )
+    )
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        for rows in result.partitions():
+            quantity, expiration, created_at, action = zip(*rows)
+
+            action_day = np.array([c.date() for c in created_at], dtype="datetime64[D]")
+            days = (np.array(expiration, dtype="datetime64[D]") - action_day).astype(np.float64)
+
+            X = np.column_stack([np.asarray(quantity, dtype=np.float64), days])
+            y = (np.asarray(action) == "wasted").astype(np.int8)
+            yield X, y
 
-    # 🔹 Calcul du nombre de jours restants
-    if product.expiration_date:
-        days_to_expire = (product.expiration_date - date.today()).days
-    else:
-        days_to_expire = 0
 
-    # 🔹 DataFrame avec LES MÊMES FEATURES que l'entraînement
-    X = pd.DataFrame([{
-        "quantity": float(product.quantity),
-        "days_to_expire": days_to_expire
-    }])
-
-    # 🔹 Prédiction ML
-    prediction = model.predict(X)[0]
-
-    # 🔹 Message métier
-    if prediction == 1:
-        message = "⚠️ Produit à risque de gaspillage"
-    else:
-        message = "✅ Produit encore consommable"
-
-    return days_to_expire, int(prediction), message
+# ================================
+# 2️⃣ Snapshot colonnaire (.npy)
+# ================================
+def write_snapshot(
+    engine: Engine,
+    out_dir: Optional[str] = None,
+    chunk_size: int = TRAINING_CHUNK_SIZE,
+) -> Optional[str]:
+    """
+    Écrit X.npy / y.npy + meta.json dans un dossier horodaté, en mémoire
+    bornée : les blocs sont d'abord ajoutés à des fichiers bruts, puis
+    recopiés dans des .npy de taille connue. Retourne le dossier, ou None
+    si l'historique est vide.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out_dir = out_dir or os.path.join(SNAPSHOT_DIR, stamp)
+    os.makedirs(out_dir, exist_ok=True)
+
+    raw_x = os.path.join(out_dir, "X.bin")
+    raw_y = os.path.join(out_dir, "y.bin")
+    n_rows = n_wasted = 0
+
+    with open(raw_x, "wb") as fx, open(raw_y, "wb") as fy:
+        for X, y in iter_training_chunks(engine, chunk_size):
+            fx.write(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+            fy.write(np.ascontiguousarray(y, dtype=np.int8).tobytes())
+            n_rows += len(y)
+            n_wasted += int(y.sum())
+
+    if n_rows == 0:
+        os.remove(raw_x)
+        os.remove(raw_y)
+        return None
+
+    _raw_to_npy(raw_x, os.path.join(out_dir, "X.npy"), np.float64, (n_rows, len(FEATURES)), chunk_size)
+    _raw_to_npy(raw_y, os.path.join(out_dir, "y.npy"), np.int8, (n_rows,), chunk_size)
+
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({
+            "created_at": stamp,
+            "rows": n_rows,
+            "wasted": n_wasted,
+            "features": FEATURES,
+            "label": "wasted",
+        }, f, indent=2)
+
+    return out_dir
+
+
+def _raw_to_npy(raw_path: str, npy_path: str, dtype, shape, chunk_size: int):
+    src = np.memmap(raw_path, dtype=dtype, mode="r", shape=shape)
+    dst = np.lib.format.open_memmap(npy_path, mode="w+", dtype=dtype, shape=shape)
+    for i in range(0, shape[0], chunk_size):
+        dst[i:i + chunk_size] = src[i:i + chunk_size]
+    dst.flush()
+    del src, dst
+    os.remove(raw_path)
+
+
+def load_snapshot(path: str, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Recharge un snapshot (memory-mappé par défaut) pour un entraînement reproductible."""
+    mode = "r" if mmap else None
+    X = np.load(os.path.join(path, "X.npy"), mmap_mode=mode)
+    y = np.load(os.path.join(path, "y.npy"), mmap_mode=mode)
+    return X, y
+
+
+def latest_snapshot() -> Optional[str]:
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return None
+    names = sorted(
+        d for d in os.listdir(SNAPSHOT_DIR)
+        if os.path.exists(os.path.join(SNAPSHOT_DIR, d, "meta.json"))
+    )
+    return os.path.join(SNAPSHOT_DIR, names[-1]) if names else None
@@ -0,0 +1,45 @@
+import os
+import resource
+
+
+def rss() -> dict:
+    """
+    Mémoire résidente du processus courant, en octets :
+    - rss       : total
+    - rss_anon  : pages privées (objets Python, tableaux copiés)
+    - rss_file  : pages de fichiers mappés, partagées via le cache de l'OS
+                  (c'est là qu'apparaissent la forêt compilée et la table en mmap)
+    Hors Linux, seul le pic de RSS (getrusage) est disponible.
+    """
+    fields = {"VmRSS": "rss", "RssAnon": "rss_anon", "RssFile": "rss_file"}
+    out = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    out[fields[key]] = int(value.split()[0]) * 1024
+    except OSError:
+        out["rss_peak"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return out
+
+
+def rss_delta(before: dict, after: dict) -> dict:
+    return {k: after[k] - before[k] for k in after if k in before}
+
+
+# ============================
+# ▶️ Mesure pour dimensionner les conteneurs
+# ============================
+if __name__ == "__main__":
+    # python -m app.ml.memory : RSS du worker avant / après chargement du modèle actif
+    from app.ml.registry import model_registry
+
+    before = rss()
+    loaded = model_registry.get()
+    after = rss()
+
+    mb = lambda v: f"{v / 1024 / 1024:.1f} Mo"
+    print(f"🧠 Modèle : {loaded.version if loaded else 'aucun'} (pid {os.getpid()})")
+    for key in after:
+        print(f"  {key:9s} avant={mb(before.get(key, 0))}  après={mb(after[key])}  Δ={mb(after[key] - before.get(key, 0))}")
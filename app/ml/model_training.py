@@ -3,46 +3,46 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
-import joblib
 import os
 
-from app.ml.data_preparation import load_data_from_db, preprocess_data
-from app.database import SessionLocal
+from app.ml.data_preparation import write_snapshot, load_snapshot, latest_snapshot
+from app.database import engine
+from app.ml.store import model_store
 
 
 BASE_DIR = os.path.dirname(__file__)
-MODEL_PATH = os.path.join(BASE_DIR, "models", "waste_predictor.joblib")
 
 os.makedirs(os.path.join(BASE_DIR, "models"), exist_ok=True)
 
 # =====================================================
 # 📌 1. Création du jeu d'entraînement depuis ta BASE SQL
 # =====================================================
-def create_training_dataset():
-    print("📦 Chargement des données depuis PostgreSQL...")
-    db = SessionLocal()
-    df = load_data_from_db(db)
-    df = preprocess_data(df)
-
-    if df.empty:
-        print("⚠️ Aucune donnée n'a été trouvée dans la base.")
-        return None
-
-    print(f"📊 {len(df)} lignes chargées depuis la DB")
-
-    # -----------------------------------------------------
-    # 🎯 Simulation du label (is_wasted)
-    # -----------------------------------------------------
-    df["is_wasted"] = df["status"].apply(
-        lambda s: 1 if s in ["périmé", "bientôt périmé"] else 0
-    )
+def create_training_dataset(snapshot=None):
+    """
+    Jeu d'entraînement (X, y) depuis un snapshot .npy.
+    - snapshot=None     → nouveau snapshot exporté depuis PostgreSQL
+    - snapshot="latest" → dernier snapshot existant (entraînement reproductible)
+    - snapshot=<chemin> → ce snapshot précis
+    """
+    if snapshot == "latest":
+        snapshot = latest_snapshot()
+        if not snapshot:
+            print("⚠️ Aucun snapshot existant.")
+            return None
+    elif snapshot is None:
+        print("📦 Export de l'historique de consommation depuis PostgreSQL...")
+        snapshot = write_snapshot(engine)
+        if not snapshot:
+            print("⚠️ Aucune donnée n'a été trouvée dans la base.")
+            return None
+
+    X, y = load_snapshot(snapshot)
+    print(f"📊 {len(y)} lignes chargées depuis {snapshot} ({int(y.sum())} gaspillées)")
 
     # -----------------------------------------------------
     # 🔥 Features UTILISÉES PAR TON API → IMPORTANT !
+    # [quantity, days_to_expire], label = gaspillé (1) / consommé (0)
     # -----------------------------------------------------
-    X = df[["quantity", "days_to_expire"]].fillna(0)
-    y = df["is_wasted"]
-
     print("🧪 Jeu d'entraînement préparé.")
     return X, y
 
@@ -50,8 +50,8 @@ def create_training_dataset():
 # =====================================================
 # 📌 2. Entraînement du modèle de prédiction
 # =====================================================
-def train_model():
-    dataset = create_training_dataset()
+def train_model(snapshot=None, promote=False):
+    dataset = create_training_dataset(snapshot)
     if not dataset:
         print("❌ Aucun dataset disponible — arrêt.")
         return
@@ -81,17 +81,26 @@ def train_model():
     print(f"✅ Modèle entraîné — Accuracy={acc:.3f}")
     print(classification_report(y_test, y_pred))
 
-    # Sauvegarde du modèle
-    os.makedirs("models", exist_ok=True)
-    joblib.dump(model, MODEL_PATH)
+    # Sauvegarde versionnée : l'API continue de servir la version active
+    # jusqu'à promotion explicite (POST /products/internal/model/promote)
+    version = model_store.save(model, metrics={"accuracy": round(float(acc), 4), "rows": int(len(y))})
+    print(f"💾 Modèle sauvegardé : version {version}")
 
-    print(f"💾 Modèle sauvegardé dans {MODEL_PATH}")
+    if promote:
+        model_store.promote(version)
+        print(f"🚀 Version {version} promue")
+
+    return version
 
 
 # =====================================================
 # 📌 3. Execution directe
 # =====================================================
 if __name__ == "__main__":
+    import sys
+
     print("🚀 Démarrage de l'entraînement du modèle FoodWaste Zero...")
-    train_model()
+    # python -m app.ml.model_training [latest|<dossier snapshot>] [--promote]
+    args = [a for a in sys.argv[1:] if a != "--promote"]
+    train_model(args[0] if args else None, promote="--promote" in sys.argv)
     print("🏁 Entraînement terminé.")
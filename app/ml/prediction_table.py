@@ -0,0 +1,133 @@
+import os
+import threading
+import warnings
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.ml.compiled_forest import CompiledForest
+
+
+# Plage de days_left précalculée : [0, PREDICTION_TABLE_MAX_DAYS]
+PREDICTION_TABLE_MAX_DAYS = int(os.getenv("PREDICTION_TABLE_MAX_DAYS", "90"))
+# Au-delà de ce nombre de cellules la table n'est pas construite (temps de chargement)
+PREDICTION_TABLE_MAX_CELLS = int(os.getenv("PREDICTION_TABLE_MAX_CELLS", "1000000"))
+
+
+def _representatives(thresholds: np.ndarray) -> np.ndarray:
+    """
+    Une valeur float32 par intervalle ]t[i-1], t[i]] (plus ]t[-1], +inf[) :
+    sklearn compare `float32(x) <= seuil`, donc toutes les quantités d'un même
+    intervalle suivent exactement le même chemin dans chaque arbre.
+    """
+    if len(thresholds) == 0:
+        return np.zeros(1, dtype=np.float32)
+
+    reps = thresholds.astype(np.float32)
+    # Arrondi vers le bas pour rester <= seuil
+    over = reps.astype(np.float64) > thresholds
+    reps[over] = np.nextafter(reps[over], np.float32(-np.inf))
+
+    last = np.float32(thresholds[-1])
+    while float(last) <= thresholds[-1]:
+        last = np.nextafter(last, np.float32(np.inf))
+
+    return np.append(reps, last)
+
+
+class PredictionTable:
+    """
+    Sorties du modèle précalculées sur la grille (intervalle de quantité × days_left).
+
+    L'axe quantité est découpé aux seuils de split du modèle sur cette feature :
+    la prédiction est constante dans chaque intervalle, la table est donc exacte.
+    L'axe days_left couvre les entiers [0, max_days] ; hors de cette plage
+    (ou valeur non finie) la ligne est un « miss » et repart vers le modèle.
+    """
+
+    def __init__(self, quantity_thresholds: np.ndarray, max_days: int, table: np.ndarray, classes: np.ndarray):
+        self.quantity_thresholds = quantity_thresholds
+        self.max_days = max_days
+        self.table = table
+        self.classes = classes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(
+        cls,
+        model,
+        forest: CompiledForest,
+        max_days: int = PREDICTION_TABLE_MAX_DAYS,
+        max_cells: int = PREDICTION_TABLE_MAX_CELLS,
+    ) -> Optional["PredictionTable"]:
+        is_split = forest.left != np.arange(forest.n_nodes)
+        thresholds = np.unique(forest.threshold[is_split & (forest.feature == 0)])
+
+        reps = _representatives(thresholds)
+        days = np.arange(0, max_days + 1, dtype=np.float32)
+        if len(reps) * len(days) > max_cells:
+            return None
+
+        grid_q, grid_d = np.meshgrid(reps, days, indexing="ij")
+        X = np.column_stack([grid_q.ravel(), grid_d.ravel()])
+
+        # Gros volume d'un coup : le prédicteur C de sklearn est plus rapide
+        # que la descente NumPy, réservée aux petits lots
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            proba = model.predict_proba(X)
+
+        table = np.argmax(proba, axis=1).astype(np.int8).reshape(len(reps), len(days))
+        return cls(thresholds, max_days, table, forest.classes)
+
+    def lookup(self, quantities, days_left) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retourne (prédictions, masque des hits). Les lignes hors grille ont
+        une prédiction indéfinie et doivent être recalculées par l'appelant.
+        """
+        q = np.asarray(quantities, dtype=np.float32).astype(np.float64)
+        d = np.asarray(days_left, dtype=np.float64)
+
+        hit = np.isfinite(q) & (d >= 0) & (d <= self.max_days) & (d == np.floor(d))
+
+        qi = np.searchsorted(self.quantity_thresholds, q[hit], side="left")
+        di = d[hit].astype(np.intp)
+
+        preds = np.zeros(len(q), dtype=self.classes.dtype)
+        preds[hit] = self.classes[self.table[qi, di]]
+
+        n_hit = int(hit.sum())
+        with self._lock:
+            self.hits += n_hit
+            self.misses += len(q) - n_hit
+
+        return preds, hit
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "table.npy"), self.table)
+        np.save(os.path.join(directory, "quantity_thresholds.npy"), self.quantity_thresholds)
+        np.save(os.path.join(directory, "classes.npy"), self.classes)
+        np.save(os.path.join(directory, "max_days.npy"), np.asarray(self.max_days))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str = "r") -> "PredictionTable":
+        return cls(
+            quantity_thresholds=np.load(os.path.join(directory, "quantity_thresholds.npy"), mmap_mode=mmap_mode),
+            max_days=int(np.load(os.path.join(directory, "max_days.npy"))),
+            table=np.load(os.path.join(directory, "table.npy"), mmap_mode=mmap_mode),
+            classes=np.load(os.path.join(directory, "classes.npy")),
+        )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "shape": list(self.table.shape),
+            "nbytes": int(self.table.nbytes + self.quantity_thresholds.nbytes),
+            "max_days": self.max_days,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
@@ -0,0 +1,212 @@
+import time
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_
+
+from app.models import Product
+from app.ml.registry import model_registry
+from app.ml.prediction_table import PREDICTION_TABLE_MAX_DAYS
+from app.ml.shadow import observe_prediction
+
+
+# ============================
+# 🏷️ Statuts métier
+# ============================
+SAFE, AT_RISK, EXPIRED = 0, 1, 2
+
+MESSAGES = {
+    SAFE: "✅ Produit sûr",
+    AT_RISK: "🔥 Produit à risque de gaspillage",
+    EXPIRED: "⚠️ Produit périmé",
+}
+
+# En dessous de ce nombre de jours, un produit est à risque quel que soit le modèle
+RISK_DAYS = 3
+
+# Jours restants explorés pour trouver la date de passage à risque
+# (au-delà, seul le jour courant est évalué)
+RISK_SCAN_DAYS = PREDICTION_TABLE_MAX_DAYS
+
+# Version enregistrée quand aucun modèle n'est chargé (règle des 3 jours seule)
+RULES_VERSION = "rules"
+
+
+# ============================
+# 🔮 Prédiction ML vectorisée
+# ============================
+def predict_waste(quantities, days_left) -> Optional[np.ndarray]:
+    """
+    Un seul appel de prédiction sur une matrice (N, 2) [quantity, days_left]
+    (forêt compilée si disponible, sinon `model.predict`).
+    Retourne None si aucun modèle n'est disponible ou si la prédiction échoue.
+    """
+    loaded = model_registry.get()
+    if loaded is None:
+        return None
+
+    X = np.column_stack([
+        np.asarray(quantities, dtype=np.float64),
+        np.asarray(days_left, dtype=np.float64),
+    ])
+    if len(X) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    try:
+        started = time.perf_counter()
+        preds = np.asarray(loaded.predict(X)).astype(np.int64)
+    except Exception:
+        return None
+
+    observe_prediction(X, preds, time.perf_counter() - started)
+    return preds
+
+
+def current_model_version() -> str:
+    loaded = model_registry.get()
+    return loaded.version if loaded else RULES_VERSION
+
+
+# ============================
+# 📅 Date de passage « à risque »
+# ============================
+def compute_risk_dates(products: Iterable, today: Optional[date] = None) -> Tuple[List[Optional[date]], Optional[str]]:
+    """
+    Date à partir de laquelle chaque produit est à risque :
+    expiration - k, où k est le plus grand nombre de jours restants
+    (entre 3 et days_left) pour lequel le modèle prédit 1 ; la règle
+    des 3 jours donne au minimum expiration - 3.
+
+    Une fois signalé par le modèle, un produit reste donc à risque jusqu'à
+    sa péremption. Le résultat ne dépend que de la quantité, de la date
+    d'expiration et du modèle : il n'y a rien à recalculer chaque nuit.
+
+    Retourne (dates, version du modèle utilisé) ; version None si la
+    prédiction a échoué (les dates se limitent alors à la règle des 3 jours).
+    """
+    today = today or date.today()
+    products = list(products)
+
+    best = np.full(len(products), RISK_DAYS, dtype=np.int64)
+    owners, quantities, ks = [], [], []
+
+    for i, p in enumerate(products):
+        if not p.expiration_date:
+            continue
+        days_left = (p.expiration_date - today).days
+        if days_left <= RISK_DAYS:
+            continue
+
+        k = np.arange(RISK_DAYS + 1, min(days_left, RISK_SCAN_DAYS) + 1)
+        if days_left > RISK_SCAN_DAYS:
+            k = np.append(k, days_left)
+        owners.append(np.full(len(k), i))
+        quantities.append(np.full(len(k), float(p.quantity)))
+        ks.append(k)
+
+    version = current_model_version()
+    if ks:
+        owners, ks = np.concatenate(owners), np.concatenate(ks)
+        preds = predict_waste(np.concatenate(quantities), ks)
+        if preds is None:
+            # Modèle présent mais en échec : la ligne restera à recalculer
+            if version != RULES_VERSION:
+                version = None
+        else:
+            risky = preds == 1
+            np.maximum.at(best, owners[risky], ks[risky])
+
+    dates = [
+        p.expiration_date - timedelta(days=int(k)) if p.expiration_date else None
+        for p, k in zip(products, best)
+    ]
+    return dates, version
+
+
+def status_from_dates(expiration_date: Optional[date], at_risk_from: Optional[date], today: date):
+    """Statut par simple comparaison de dates : (days_left, prediction, message)."""
+    if not expiration_date:
+        return None, SAFE, MESSAGES[SAFE]
+
+    days_left = (expiration_date - today).days
+    if days_left < 0:
+        return days_left, EXPIRED, MESSAGES[EXPIRED]
+    if days_left <= RISK_DAYS or (at_risk_from is not None and at_risk_from <= today):
+        return days_left, AT_RISK, MESSAGES[AT_RISK]
+    return days_left, SAFE, MESSAGES[SAFE]
+
+
+def get_predictions_and_messages(
+    products: Iterable, today: Optional[date] = None
+) -> List[Tuple[Optional[int], int, str]]:
+    """
+    Triplet (days_left, prediction, message) par produit.
+    Utilise `at_risk_from` stocké ; le modèle n'est appelé (en un seul lot)
+    que pour les produits qui n'ont pas encore de date calculée.
+    """
+    today = today or date.today()
+    products = list(products)
+
+    risk_dates = [getattr(p, "at_risk_from", None) for p in products]
+    missing = [i for i, (p, d) in enumerate(zip(products, risk_dates)) if d is None and p.expiration_date]
+    if missing:
+        computed, _ = compute_risk_dates([products[i] for i in missing], today=today)
+        for i, d in zip(missing, computed):
+            risk_dates[i] = d
+
+    return [
+        status_from_dates(p.expiration_date, d, today)
+        for p, d in zip(products, risk_dates)
+    ]
+
+
+def assess_product(product, today: Optional[date] = None):
+    """
+    Recalcule et enregistre sur l'objet ORM at_risk_from, la version du
+    modèle et le statut courant (à appeler quand la quantité change).
+    """
+    today = today or date.today()
+    (at_risk_from,), version = compute_risk_dates([product], today=today)
+
+    product.at_risk_from = at_risk_from
+    product.risk_model_version = version
+    days_left, pred, msg = status_from_dates(product.expiration_date, at_risk_from, today)
+    product.prediction = pred
+    product.message = msg
+    return days_left, pred, msg
+
+
+# ============================
+# 🗄️ Filtres SQL (indexés)
+# ============================
+def expired_clause(today: date):
+    return Product.expiration_date < today
+
+
+def at_risk_clause(today: date):
+    return and_(
+        Product.expiration_date >= today,
+        or_(
+            Product.at_risk_from <= today,
+            Product.expiration_date <= today + timedelta(days=RISK_DAYS),
+        ),
+    )
+
+
+def safe_clause(today: date):
+    return or_(
+        # Sans date d'expiration (lignes anciennes) : sûr, comme status_from_dates
+        Product.expiration_date.is_(None),
+        and_(
+            Product.expiration_date > today + timedelta(days=RISK_DAYS),
+            or_(Product.at_risk_from.is_(None), Product.at_risk_from > today),
+        ),
+    )
+
+
+STATUS_CLAUSES = {
+    "expired": expired_clause,
+    "at_risk": at_risk_clause,
+    "safe": safe_clause,
+}
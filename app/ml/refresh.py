@@ -0,0 +1,260 @@
+import argparse
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Date, Integer, String, and_, bindparam, column, create_engine, or_, select, update, values
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.database import DATABASE_URL
+from app.models import Product
+from app.ml.predictor import compute_risk_dates, current_model_version, status_from_dates
+
+
+REFRESH_CHUNK_SIZE = int(os.getenv("REFRESH_CHUNK_SIZE", "5000"))
+REFRESH_WORKERS = int(os.getenv("REFRESH_WORKERS", "4"))
+REFRESH_PARTITIONS = int(os.getenv("REFRESH_PARTITIONS", "16"))
+
+# Colonnes réécrites par le rafraîchissement
+UPDATED_FIELDS = ("at_risk_from", "risk_model_version", "prediction", "message")
+
+
+# ============================
+# 💾 Écriture groupée
+# ============================
+def _bulk_update(db: Session, rows: List[dict]):
+    """
+    Une seule requête par chunk :
+    UPDATE products SET ... FROM (VALUES ...) AS v WHERE products.id = v.id
+    (PostgreSQL). Les autres dialectes (SQLite en test) passent par executemany.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        v = values(
+            column("id", UUID(as_uuid=True)),
+            column("at_risk_from", Date),
+            column("risk_model_version", String),
+            column("prediction", Integer),
+            column("message", String),
+            name="v",
+        ).data([(r["id"], *(r[f] for f in UPDATED_FIELDS)) for r in rows])
+
+        db.execute(
+            update(Product)
+            .where(Product.id == v.c.id)
+            .values({f: v.c[f] for f in UPDATED_FIELDS})
+        )
+        return
+
+    table = Product.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values({f: bindparam(f"b_{f}") for f in UPDATED_FIELDS}),
+        [{f"b_{k}": v for k, v in r.items()} for r in rows],
+    )
+
+
+# ============================
+# 🔄 Rafraîchissement par chunks
+# ============================
+def refresh_predictions(
+    db: Session,
+    chunk_size: int = REFRESH_CHUNK_SIZE,
+    id_from=None,
+    id_to=None,
+    today: Optional[date] = None,
+    full: bool = False,
+) -> dict:
+    """
+    Recalcule at_risk_from (et le statut stocké) des produits de la plage
+    d'ids [id_from, id_to[ en pagination keyset sur `id` :
+    - seuls les produits jamais calculés ou calculés par un autre modèle
+      sont lus (tous si `full`) : après un déploiement, pas chaque nuit
+    - un seul appel au modèle par chunk
+    - seules les lignes qui changent sont réécrites
+    - un commit par chunk (verrous courts, mémoire bornée)
+    """
+    today = today or date.today()
+    started = time.perf_counter()
+    version = current_model_version()
+
+    scanned = changed = chunks = 0
+    last_id = id_from
+    first = True
+
+    while True:
+        stmt = select(
+            Product.id, Product.quantity, Product.expiration_date,
+            *(getattr(Product, f) for f in UPDATED_FIELDS),
+        )
+        if not full:
+            stmt = stmt.where(or_(
+                # Sans date d'expiration, at_risk_from reste NULL : seule la version compte
+                and_(Product.at_risk_from.is_(None), Product.expiration_date.is_not(None)),
+                Product.risk_model_version.is_(None),
+                Product.risk_model_version != version,
+            ))
+        if last_id is not None:
+            # Premier chunk inclusif sur id_from, puis strictement après le dernier id vu
+            stmt = stmt.where(Product.id >= last_id if first else Product.id > last_id)
+        if id_to is not None:
+            stmt = stmt.where(Product.id < id_to)
+
+        rows = db.execute(stmt.order_by(Product.id).limit(chunk_size)).all()
+        first = False
+        if not rows:
+            break
+
+        risk_dates, used_version = compute_risk_dates(rows, today=today)
+
+        dirty = []
+        for r, at_risk_from in zip(rows, risk_dates):
+            _, pred, msg = status_from_dates(r.expiration_date, at_risk_from, today)
+            new = {
+                "at_risk_from": at_risk_from,
+                "risk_model_version": used_version,
+                "prediction": pred,
+                "message": msg,
+            }
+            if any(getattr(r, f) != new[f] for f in UPDATED_FIELDS):
+                dirty.append({"id": r.id, **new})
+
+        if dirty:
+            _bulk_update(db, dirty)
+        db.commit()
+
+        scanned += len(rows)
+        changed += len(dirty)
+        chunks += 1
+        last_id = rows[-1].id
+
+        if len(rows) < chunk_size:
+            break
+
+    elapsed = time.perf_counter() - started
+    return {
+        "scanned": scanned,
+        "changed": changed,
+        "chunks": chunks,
+        "model_version": version,
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_sec": round(scanned / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+# ============================
+# 🧩 Rafraîchissement partitionné (multi-processus)
+# ============================
+def id_partitions(n: int):
+    """
+    Découpe l'espace des UUID en `n` plages [lo, hi[ de même taille.
+    Les ids étant des UUID v4 aléatoires, les partitions sont équilibrées.
+    """
+    bounds = [uuid.UUID(int=(k << 128) // n) for k in range(n)] + [None]
+    return [(bounds[k], bounds[k + 1]) for k in range(n)]
+
+
+# Session propre à chaque processus worker (jamais héritée du parent)
+_worker_session = None
+
+
+def _init_worker(database_url: str):
+    global _worker_session
+    engine = create_engine(database_url, pool_pre_ping=True, pool_size=1, max_overflow=0)
+    _worker_session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _refresh_partition(index: int, n: int, chunk_size: int, full: bool) -> dict:
+    # Le registre du modèle est global au module : chargé une fois par worker
+    id_from, id_to = id_partitions(n)[index]
+    db = _worker_session()
+    try:
+        return refresh_predictions(db, chunk_size=chunk_size, id_from=id_from, id_to=id_to, full=full)
+    finally:
+        db.close()
+
+
+def run_partitioned_refresh(
+    partitions: int = REFRESH_PARTITIONS,
+    workers: int = REFRESH_WORKERS,
+    only: Optional[Iterable[int]] = None,
+    chunk_size: int = REFRESH_CHUNK_SIZE,
+    full: bool = False,
+    retries: int = 1,
+    database_url: str = DATABASE_URL,
+) -> dict:
+    """
+    Répartit le rafraîchissement sur `partitions` plages d'ids exécutées par
+    un ProcessPoolExecutor de `workers` processus (connexion DB et modèle
+    propres à chaque worker). Une partition en échec est retentée `retries`
+    fois ; celles qui échouent encore sont listées dans `failed` et peuvent
+    être relancées seules via `only`.
+    """
+    started = time.perf_counter()
+    todo = sorted(set(only)) if only is not None else list(range(partitions))
+    if any(i < 0 or i >= partitions for i in todo):
+        raise ValueError("Indice de partition hors plage")
+
+    results, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(database_url,)) as pool:
+        for _ in range(retries + 1):
+            if not todo:
+                break
+            futures = {
+                pool.submit(_refresh_partition, i, partitions, chunk_size, full): i
+                for i in todo
+            }
+            todo = []
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                    errors.pop(i, None)
+                except Exception as e:
+                    errors[i] = f"{type(e).__name__}: {e}"
+                    todo.append(i)
+
+    elapsed = time.perf_counter() - started
+    scanned = sum(r["scanned"] for r in results.values())
+    return {
+        "partitions": partitions,
+        "workers": workers,
+        "scanned": scanned,
+        "changed": sum(r["changed"] for r in results.values()),
+        "chunks": sum(r["chunks"] for r in results.values()),
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_sec": round(scanned / elapsed, 1) if elapsed > 0 else None,
+        "succeeded": sorted(results),
+        "failed": sorted(errors),
+        "errors": {str(i): errors[i] for i in sorted(errors)},
+        "by_partition": {str(i): results[i] for i in sorted(results)},
+    }
+
+
+# ============================
+# ▶️ Exécution directe (cron)
+# ============================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rafraîchissement des prédictions produits")
+    parser.add_argument("--workers", type=int, default=REFRESH_WORKERS)
+    parser.add_argument("--partitions", type=int, default=REFRESH_PARTITIONS)
+    parser.add_argument("--only", type=int, nargs="*", help="Relancer uniquement ces partitions")
+    parser.add_argument("--chunk-size", type=int, default=REFRESH_CHUNK_SIZE)
+    parser.add_argument("--full", action="store_true")
+    args = parser.parse_args()
+
+    report = run_partitioned_refresh(
+        partitions=args.partitions,
+        workers=args.workers,
+        only=args.only,
+        chunk_size=args.chunk_size,
+        full=args.full,
+    )
+    print(f"🔄 {report['scanned']} lignes lues, {report['changed']} modifiées "
+          f"en {report['elapsed_s']}s ({report['rows_per_sec']} lignes/s)")
+    if report["failed"]:
+        print(f"❌ Partitions en échec : {report['failed']} — relancer avec --only {' '.join(map(str, report['failed']))}")
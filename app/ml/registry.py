@@ -0,0 +1,387 @@
+import hashlib
+import os
+import threading
+import time
+import warnings
+import dataclasses
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import joblib
+import numpy as np
+
+from app.ml.compiled_forest import CompiledForest
+from app.ml.prediction_table import PredictionTable
+from app.ml.store import ModelStore, model_store, COMPILED_DIR, TABLE_DIR
+from app.ml.memory import rss, rss_delta
+
+MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "models", "waste_predictor.joblib"))
+
+# Intervalle minimal (en secondes) entre deux vérifications du fichier modèle
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "5"))
+
+# Forêt compilée et table exportées (.npy) ouvertes en mmap : partagées entre
+# workers via le cache de pages. Pas le modèle sklearn : Tree.__setstate__
+# recopie ses nœuds en mémoire privée, même chargé avec mmap_mode="r".
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+
+# Taille de lot jusqu'à laquelle on prédit avec la forêt compilée
+COMPILED_MAX_ROWS = 256
+
+# Lignes de préchauffage (quantité, jours restants) avant de servir un modèle
+WARMUP_X = np.column_stack([np.linspace(0.5, 10, 64), np.arange(-4, 124, 2)])
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """Instantané immuable d'un modèle chargé (remplacé d'un bloc au rechargement)."""
+    model: Any
+    version: str
+    path: str
+    mtime: float
+    size: int
+    loaded_at: datetime
+    compiled: Optional[CompiledForest] = None
+    table: Optional[PredictionTable] = None
+    # RSS du worker avant / après chargement (dimensionnement des conteneurs)
+    memory: Optional[dict] = None
+
+    def predict(self, X):
+        """
+        Prédiction : table précalculée d'abord, puis forêt compilée
+        (ou sklearn) uniquement pour les lignes hors grille.
+        """
+        if self.table is None:
+            return self._predict_model(X)
+
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        preds, hit = self.table.lookup(X[:, 0], X[:, 1])
+        if not hit.all():
+            preds[~hit] = self._predict_model(X[~hit])
+        return preds
+
+    def _predict_model(self, X):
+        # La forêt compilée gagne sur les petits lots (pas de validation ni de
+        # dispatch joblib) ; au-delà, le prédicteur C de sklearn reprend la main
+        if self.compiled is not None and len(X) <= COMPILED_MAX_ROWS:
+            return self.compiled.predict(X)
+        return self.model.predict(X)
+
+
+class LazyModel:
+    """
+    Modèle sklearn désérialisé au premier usage seulement (lots hors table
+    trop gros pour la forêt compilée) : tant qu'il ne sert pas, le worker
+    ne paie pas sa copie privée des nœuds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def _get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = joblib.load(self.path)
+        return self._model
+
+    def predict(self, X):
+        return self._get().predict(X)
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _compile(model) -> Optional[CompiledForest]:
+    """Forêt compilée en tableaux NumPy, ou None si le modèle n'est pas une forêt."""
+    if not hasattr(model, "estimators_"):
+        return None
+    try:
+        return CompiledForest.from_sklearn(model)
+    except Exception:
+        return None
+
+
+def _build_table(model, compiled: Optional[CompiledForest]) -> Optional[PredictionTable]:
+    """Table de prédictions précalculée (modèles à 2 features uniquement)."""
+    if compiled is None or getattr(model, "n_features_in_", None) != 2:
+        return None
+    try:
+        return PredictionTable.build(model, compiled)
+    except Exception:
+        return None
+
+
+def _warm_up(loaded: "LoadedModel"):
+    """Premières prédictions (table, forêt compilée, sklearn) hors trafic."""
+    loaded.predict(WARMUP_X[:1])
+    loaded.predict(WARMUP_X)
+    if not isinstance(loaded.model, LazyModel):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            loaded.model.predict(WARMUP_X)
+    if loaded.table is not None:
+        loaded.table.hits = loaded.table.misses = 0
+
+
+def load_artifact(path: str, version: Optional[str] = None) -> LoadedModel:
+    """
+    Charge, compile, précalcule la table et préchauffe un artefact.
+    Sans version explicite (fichier historique), la version est le hash du fichier.
+
+    Si la forêt compilée et la table ont été exportées à côté de l'artefact
+    (voir ModelStore.save), elles sont ouvertes en mmap au lieu d'être
+    recalculées : ces pages-là sont partagées par tous les workers, et le
+    modèle sklearn (copié en mémoire privée à la désérialisation) n'est
+    chargé qu'au premier lot qu'elles ne couvrent pas.
+    """
+    mmap_mode = "r" if MODEL_MMAP else None
+    before = rss()
+
+    st = os.stat(path)
+    version = version or _file_sha256(path)[:12]
+
+    base = os.path.dirname(path)
+    compiled_dir, table_dir = os.path.join(base, COMPILED_DIR), os.path.join(base, TABLE_DIR)
+
+    if os.path.isdir(compiled_dir) and os.path.isdir(table_dir):
+        model = LazyModel(path)
+        compiled = CompiledForest.load(compiled_dir, mmap_mode=mmap_mode)
+        table = PredictionTable.load(table_dir, mmap_mode=mmap_mode)
+    else:
+        model = joblib.load(path)
+        compiled = (
+            CompiledForest.load(compiled_dir, mmap_mode=mmap_mode)
+            if os.path.isdir(compiled_dir) else _compile(model)
+        )
+        table = (
+            PredictionTable.load(table_dir, mmap_mode=mmap_mode)
+            if os.path.isdir(table_dir) else _build_table(model, compiled)
+        )
+
+    loaded = LoadedModel(
+        model=model,
+        version=version,
+        path=path,
+        mtime=st.st_mtime,
+        size=st.st_size,
+        loaded_at=datetime.now(timezone.utc),
+        compiled=compiled,
+        table=table,
+    )
+    _warm_up(loaded)
+
+    after = rss()
+    return dataclasses.replace(loaded, memory={"before": before, "after": after, "delta": rss_delta(before, after)})
+
+
+def _is_current(loaded: Optional[LoadedModel], path: str) -> bool:
+    if loaded is None or loaded.path != path:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        # Fichier disparu : on garde le dernier modèle valide
+        return True
+    return (st.st_mtime, st.st_size) == (loaded.mtime, loaded.size)
+
+
+class ModelRegistry:
+    """
+    Registre du modèle ML partagé par tout le processus :
+    - l'artefact n'est désérialisé qu'une fois par worker
+    - la version servie est la version `active` du dépôt versionné
+      (app.ml.store), ou à défaut le fichier historique `MODEL_PATH`
+    - un changement (promotion, fichier modifié) est chargé et préchauffé
+      en arrière-plan, puis remplacé atomiquement : les requêtes continuent
+      sur l'ancien modèle pendant ce temps
+    - une version candidate peut tourner en shadow (voir app.ml.shadow)
+    """
+
+    def __init__(
+        self,
+        path: str = MODEL_PATH,
+        store: Optional[ModelStore] = None,
+        check_interval: float = MODEL_CHECK_INTERVAL,
+        background_reload: bool = True,
+    ):
+        self.path = path
+        self.store = store
+        self.check_interval = check_interval
+        self.background_reload = background_reload
+        self._current: Optional[LoadedModel] = None
+        self._shadow: Optional[LoadedModel] = None
+        self._shadow_rate = 0.0
+        self._lock = threading.Lock()
+        self._loading = False
+        self._last_check = 0.0
+        self._last_error: Optional[str] = None
+
+    # ----------------------------
+    # Lecture
+    # ----------------------------
+    def get(self) -> Optional[LoadedModel]:
+        now = time.monotonic()
+        if self._current is None:
+            self._refresh(now, blocking=True)
+        elif now - self._last_check >= self.check_interval:
+            self._refresh(now, blocking=not self.background_reload)
+        return self._current
+
+    def get_model(self):
+        loaded = self.get()
+        return loaded.model if loaded else None
+
+    def shadow(self):
+        """(modèle shadow, taux d'échantillonnage) — (None, 0) si inactif."""
+        self.get()
+        return self._shadow, self._shadow_rate
+
+    def info(self) -> dict:
+        loaded = self.get()
+        shadow, rate = self._shadow, self._shadow_rate
+        out = {
+            "loaded": loaded is not None,
+            "path": loaded.path if loaded else self.path,
+            "error": self._last_error,
+            "shadow": {"version": shadow.version, "sample_rate": rate} if shadow else None,
+        }
+        if loaded:
+            out.update({
+                "version": loaded.version,
+                "loaded_at": loaded.loaded_at.isoformat(),
+                "file_mtime": datetime.fromtimestamp(loaded.mtime, tz=timezone.utc).isoformat(),
+                "compiled_nodes": loaded.compiled.n_nodes if loaded.compiled else None,
+                "prediction_table": loaded.table.stats() if loaded.table else None,
+                "mmap": MODEL_MMAP,
+                "memory": {**(loaded.memory or {}), "now": rss()},
+            })
+        return out
+
+    # ----------------------------
+    # Promotion / rechargement
+    # ----------------------------
+    def load_version(self, version: str) -> LoadedModel:
+        """Charge et préchauffe une version du dépôt sans la servir."""
+        return load_artifact(self.store.path_for(version), version)
+
+    def install(self, loaded: LoadedModel):
+        """Sert immédiatement un modèle déjà chargé et préchauffé."""
+        with self._lock:
+            self._current = loaded
+            if self._shadow is not None and self._shadow.version == loaded.version:
+                self._shadow, self._shadow_rate = None, 0.0
+            self._last_check = time.monotonic()
+
+    def reload(self) -> Optional[LoadedModel]:
+        """Rechargement forcé et bloquant du modèle actif."""
+        self._refresh(time.monotonic(), blocking=True, force=True)
+        return self._current
+
+    def recheck(self):
+        """Relit le manifeste tout de suite (bloquant), sans forcer de rechargement."""
+        self._last_check = float("-inf")
+        self._refresh(time.monotonic(), blocking=True)
+
+    def _targets(self):
+        """(chemin, version) du modèle actif et config shadow d'après le manifeste."""
+        manifest = self.store.read_manifest() if self.store else {}
+        active = manifest.get("active")
+        primary = (self.store.path_for(active), active) if active else (self.path, None)
+
+        shadow = manifest.get("shadow") or None
+        if shadow and shadow.get("version"):
+            shadow = (self.store.path_for(shadow["version"]), shadow["version"], float(shadow.get("sample_rate", 0)))
+        else:
+            shadow = None
+        return primary, shadow
+
+    def _refresh(self, now: float, blocking: bool, force: bool = False):
+        with self._lock:
+            # Un autre thread a peut-être déjà vérifié pendant qu'on attendait le verrou
+            if not force and self._current is not None and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            if self._loading:
+                return
+
+            primary, shadow = self._targets()
+            if not os.path.exists(primary[0]) and self._current is None:
+                self._last_error = "model file not found"
+                return
+
+            need_primary = force or not _is_current(self._current, primary[0])
+            need_shadow = (shadow is None) != (self._shadow is None) or (
+                shadow is not None and not _is_current(self._shadow, shadow[0])
+            )
+            if shadow is not None:
+                self._shadow_rate = shadow[2]
+            if not need_primary and not need_shadow:
+                return
+
+            if blocking or self._current is None:
+                self._load(primary if need_primary else None, shadow, need_shadow)
+            else:
+                self._loading = True
+                threading.Thread(
+                    target=self._load_in_background,
+                    args=(primary if need_primary else None, shadow, need_shadow),
+                    daemon=True,
+                ).start()
+
+    def _load_in_background(self, primary, shadow, need_shadow):
+        try:
+            self._load(primary, shadow, need_shadow)
+        finally:
+            self._loading = False
+
+    def _load(self, primary, shadow, need_shadow):
+        if primary is not None:
+            path, version = primary
+            try:
+                if version is None and self._current is not None and self._current.path == path:
+                    # Fichier historique touché mais contenu identique : pas de rechargement
+                    st = os.stat(path)
+                    digest = _file_sha256(path)[:12]
+                    if digest == self._current.version:
+                        c = self._current
+                        self._current = LoadedModel(
+                            c.model, c.version, c.path, st.st_mtime, st.st_size,
+                            c.loaded_at, c.compiled, c.table, c.memory,
+                        )
+                        primary = None
+                if primary is not None:
+                    self._current = load_artifact(path, version)
+                self._last_error = None
+            except Exception as e:
+                self._last_error = f"load failed: {e}"
+
+        if need_shadow:
+            try:
+                self._shadow = load_artifact(shadow[0], shadow[1]) if shadow else None
+                self._shadow_rate = shadow[2] if shadow else 0.0
+            except Exception as e:
+                self._shadow, self._shadow_rate = None, 0.0
+                self._last_error = f"shadow load failed: {e}"
+
+
+# Instance unique par processus
+model_registry = ModelRegistry(store=model_store)
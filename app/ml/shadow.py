@@ -0,0 +1,117 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+from app.ml.registry import model_registry
+
+
+# ============================
+# 📈 Métriques Prometheus
+# ============================
+PREDICTION_LATENCY = Histogram(
+    "model_prediction_latency_seconds",
+    "Latence d'un appel de prédiction",
+    ["role"],
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0),
+)
+SHADOW_ROWS = Counter(
+    "model_shadow_rows_total",
+    "Lignes scorées par le modèle shadow, par accord avec le modèle actif",
+    ["shadow_version", "result"],
+)
+SHADOW_DROPPED = Counter(
+    "model_shadow_dropped_total",
+    "Appels échantillonnés non rejoués sur le shadow (file pleine)",
+    ["shadow_version"],
+)
+
+
+class ShadowStats:
+    """Compteurs en mémoire (par version shadow) exposés par l'endpoint modèle."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_version = {}
+
+    def record(self, version: str, rows: int, agree: int, primary_s: float, shadow_s: float):
+        with self._lock:
+            st = self._by_version.setdefault(version, {
+                "calls": 0, "rows": 0, "agree": 0, "primary_s": 0.0, "shadow_s": 0.0,
+            })
+            st["calls"] += 1
+            st["rows"] += rows
+            st["agree"] += agree
+            st["primary_s"] += primary_s
+            st["shadow_s"] += shadow_s
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                version: {
+                    "calls": st["calls"],
+                    "rows": st["rows"],
+                    "agreement": round(st["agree"] / st["rows"], 4) if st["rows"] else None,
+                    "primary_mean_ms": round(st["primary_s"] / st["calls"] * 1000, 3),
+                    "shadow_mean_ms": round(st["shadow_s"] / st["calls"] * 1000, 3),
+                }
+                for version, st in self._by_version.items()
+            }
+
+
+shadow_stats = ShadowStats()
+
+# Le scoring shadow tourne hors du chemin de la requête
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+# Scorings en cours ou en attente : au-delà, l'échantillon est abandonné
+# (la file de l'executor n'est pas bornée, chaque tâche garde une copie de X)
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "4"))
+_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+
+
+def _score(shadow, X: np.ndarray, primary_preds: np.ndarray, primary_s: float):
+    try:
+        _run_score(shadow, X, primary_preds, primary_s)
+    finally:
+        _slots.release()
+
+
+def _run_score(shadow, X: np.ndarray, primary_preds: np.ndarray, primary_s: float):
+    started = time.perf_counter()
+    try:
+        preds = np.asarray(shadow.predict(X)).astype(np.int64)
+    except Exception:
+        return
+    shadow_s = time.perf_counter() - started
+
+    agree = int((preds == primary_preds).sum())
+    PREDICTION_LATENCY.labels(role="shadow").observe(shadow_s)
+    SHADOW_ROWS.labels(shadow_version=shadow.version, result="agree").inc(agree)
+    SHADOW_ROWS.labels(shadow_version=shadow.version, result="disagree").inc(len(preds) - agree)
+    shadow_stats.record(shadow.version, len(preds), agree, primary_s, shadow_s)
+
+
+def observe_prediction(X: np.ndarray, primary_preds: np.ndarray, primary_s: float):
+    """
+    Enregistre la latence du modèle actif et, pour un échantillon des appels,
+    rejoue la même entrée sur le modèle shadow en tâche de fond. Si le
+    shadow a déjà SHADOW_MAX_PENDING appels en cours, l'échantillon est
+    abandonné (et compté) plutôt que mis en file.
+    """
+    PREDICTION_LATENCY.labels(role="primary").observe(primary_s)
+
+    shadow, rate = model_registry.shadow()
+    if shadow is None or random.random() >= rate:
+        return
+    if not _slots.acquire(blocking=False):
+        SHADOW_DROPPED.labels(shadow_version=shadow.version).inc()
+        return
+    try:
+        _executor.submit(_score, shadow, X.copy(), np.asarray(primary_preds).copy(), primary_s)
+    except Exception:
+        _slots.release()
+        raise
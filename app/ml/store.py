@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+import joblib
+
+from app.ml.compiled_forest import CompiledForest
+from app.ml.prediction_table import PredictionTable
+
+
+STORE_DIR = os.getenv(
+    "MODEL_STORE_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "models", "store")),
+)
+MODEL_FILENAME = "model.joblib"
+# Tableaux .npy exportés à côté de l'artefact, ouverts en mmap par les workers
+COMPILED_DIR = "compiled"
+TABLE_DIR = "table"
+
+
+def export_arrays(model, directory: str):
+    """Forêt compilée + table de prédictions en .npy (forêts uniquement)."""
+    if not hasattr(model, "estimators_"):
+        return
+    compiled = CompiledForest.from_sklearn(model)
+    compiled.save(os.path.join(directory, COMPILED_DIR))
+    if getattr(model, "n_features_in_", None) == 2:
+        table = PredictionTable.build(model, compiled)
+        if table is not None:
+            table.save(os.path.join(directory, TABLE_DIR))
+
+
+class ModelStore:
+    """
+    Dépôt versionné des modèles :
+
+        store/
+          manifest.json            {"active": ..., "shadow": ..., "versions": {...}}
+          <version>/model.joblib   (non compressé → mmap possible)
+          <version>/compiled/*.npy forêt aplatie
+          <version>/table/*.npy    table de prédictions
+
+    Les artefacts ne sont jamais écrasés ; l'API sert la version `active`
+    du manifeste, qui ne change que par promotion explicite.
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+
+    # ----------------------------
+    # Manifeste
+    # ----------------------------
+    def read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"active": None, "shadow": None, "versions": {}}
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        # Rename atomique : les workers ne lisent jamais un manifeste partiel
+        os.replace(tmp, self.manifest_path)
+
+    def manifest_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return None
+
+    # ----------------------------
+    # Versions
+    # ----------------------------
+    def path_for(self, version: str) -> str:
+        return os.path.join(self.root, version, MODEL_FILENAME)
+
+    def versions(self) -> dict:
+        return self.read_manifest().get("versions", {})
+
+    def active(self) -> Optional[str]:
+        return self.read_manifest().get("active")
+
+    def save(self, model, metrics: Optional[dict] = None) -> str:
+        """Enregistre un nouvel artefact (non promu) et retourne sa version."""
+        now = datetime.now(timezone.utc)
+        version = now.strftime("v%Y%m%dT%H%M%SZ")
+        suffix = 1
+        while os.path.exists(os.path.join(self.root, version)):
+            suffix += 1
+            version = now.strftime("v%Y%m%dT%H%M%SZ") + f"-{suffix}"
+
+        target_dir = os.path.join(self.root, version)
+        tmp_dir = target_dir + ".tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        # Non compressé : chargement rapide (le modèle n'est lu qu'en secours,
+        # la forêt compilée et la table exportées servent en mmap)
+        joblib.dump(model, os.path.join(tmp_dir, MODEL_FILENAME), compress=0)
+        export_arrays(model, tmp_dir)
+        os.replace(tmp_dir, target_dir)
+
+        with self._lock:
+            manifest = self.read_manifest()
+            manifest.setdefault("versions", {})[version] = {
+                "created_at": now.isoformat(),
+                "metrics": metrics or {},
+            }
+            self._write_manifest(manifest)
+        return version
+
+    def promote(self, version: str):
+        with self._lock:
+            manifest = self.read_manifest()
+            if version not in manifest.get("versions", {}):
+                raise KeyError(version)
+            manifest["active"] = version
+            manifest["versions"][version]["promoted_at"] = datetime.now(timezone.utc).isoformat()
+            # Une version promue n'est plus en shadow
+            if (manifest.get("shadow") or {}).get("version") == version:
+                manifest["shadow"] = None
+            self._write_manifest(manifest)
+
+    def set_shadow(self, version: Optional[str], sample_rate: float = 0.1):
+        with self._lock:
+            manifest = self.read_manifest()
+            if version is not None and version not in manifest.get("versions", {}):
+                raise KeyError(version)
+            manifest["shadow"] = {"version": version, "sample_rate": sample_rate} if version else None
+            self._write_manifest(manifest)
+
+
+model_store = ModelStore()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Date, Integer, ForeignKey, CheckConstraint, Numeric
+from sqlalchemy import Column, String, Date, Integer, ForeignKey, CheckConstraint, Numeric, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
@@ -34,10 +34,21 @@ class Product(Base):
 
     prediction = Column(Integer, default=0)
     message = Column(String, default="✅ Produit sûr")
+    # Date de passage « à risque » (modèle + règle des 3 jours) : le statut
+    # se déduit par comparaison de dates, sans réécriture quotidienne
+    at_risk_from = Column(Date, nullable=True)
+    # Version du modèle ayant calculé at_risk_from (recalcul au déploiement)
+    risk_model_version = Column(String, nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     owner = relationship("User")
 
+    __table_args__ = (
+        Index("ix_products_user_at_risk_from", "user_id", "at_risk_from"),
+        # Alertes : produits d'un utilisateur par date d'expiration
+        Index("ix_products_user_expiration", "user_id", "expiration_date"),
+    )
+
 
 class ConsumptionHistory(Base):
     __tablename__ = "consumption_history"
@@ -47,11 +58,47 @@ class ConsumptionHistory(Base):
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="SET NULL"))
     action = Column(String, nullable=False)  # "consumed" ou "wasted"
     amount = Column(Numeric(12, 3), nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    # Copie du produit au moment de l'action : reste lisible après suppression
+    product_name = Column(String, nullable=True)
+    category_name = Column(String, nullable=True)
+    # Features du modèle au moment de l'action (quantité détenue avant l'action)
+    product_quantity = Column(Numeric, nullable=True)
+    product_expiration_date = Column(Date, nullable=True)
+    # Clé de partitionnement (PostgreSQL : une partition par mois) : elle doit
+    # faire partie de la clé primaire, l'ORM continue d'identifier par `id`
+    created_at = Column(TIMESTAMP(timezone=True), primary_key=True, nullable=False, server_default=func.now())
 
     __table_args__ = (
         CheckConstraint("action IN ('consumed','wasted')", name="check_action_valid"),
+        # Historique d'un utilisateur, du plus récent au plus ancien (pagination)
+        Index("ix_consumption_history_user_created", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+    __mapper_args__ = {"primary_key": [id]}
+
+
+class ConsumptionHistoryMonthly(Base):
+    """Historique archivé : totaux par utilisateur et par mois (lignes brutes supprimées)."""
+    __tablename__ = "consumption_history_monthly"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # 1er jour du mois
+    consumed_count = Column(Integer, nullable=False, default=0)
+    wasted_count = Column(Integer, nullable=False, default=0)
+    consumed_amount = Column(Numeric(14, 3), nullable=False, default=0)
+    wasted_amount = Column(Numeric(14, 3), nullable=False, default=0)
+
+
+class UserDailyRollup(Base):
+    """Totaux consommé / gaspillé par utilisateur et par jour (maintenus à l'écriture)."""
+    __tablename__ = "user_daily_rollup"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    consumed_count = Column(Integer, nullable=False, default=0)
+    wasted_count = Column(Integer, nullable=False, default=0)
+    consumed_amount = Column(Numeric(14, 3), nullable=False, default=0)
+    wasted_amount = Column(Numeric(14, 3), nullable=False, default=0)
 
 
 class DailyStats(Base):
@@ -65,6 +112,37 @@ class DailyStats(Base):
     safe = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
+
+class DailyCategoryStats(Base):
+    """Répartition périmés / à risque / sûrs par catégorie et par jour."""
+    __tablename__ = "daily_category_stats"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    stat_date = Column(Date, nullable=False)
+    # NULL = produits sans catégorie
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=True)
+    total_products = Column(Integer, nullable=False)
+    expired = Column(Integer, nullable=False)
+    risky = Column(Integer, nullable=False)
+    safe = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_daily_category_stats_date_category", "stat_date", "category_id"),
+    )
+
+
+class DailyUserStats(Base):
+    """Répartition périmés / à risque / sûrs par utilisateur et par jour."""
+    __tablename__ = "daily_user_stats"
+
+    stat_date = Column(Date, primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    total_products = Column(Integer, nullable=False)
+    expired = Column(Integer, nullable=False)
+    risky = Column(Integer, nullable=False)
+    safe = Column(Integer, nullable=False)
+
+
 class Category(Base):
     __tablename__ = "categories"
 
@@ -75,3 +153,23 @@ class Category(Base):
     products = relationship("Product", back_populates="category_rel")
 
 
+class ExternalCache(Base):
+    """Réponses des API externes (OpenFoodFacts, TheMealDB), partagées entre workers."""
+    __tablename__ = "external_cache"
+
+    source = Column(String, primary_key=True)  # ex: "off_barcode", "mealdb_search"
+    key = Column(String, primary_key=True)     # requête / code-barres normalisé
+    value = Column(JSON, nullable=True)
+    fetched_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+
+class OffProduct(Base):
+    """Index local des codes-barres OpenFoodFacts (importé depuis l'export public)."""
+    __tablename__ = "off_products"
+
+    code = Column(String, primary_key=True)
+    name = Column(String, nullable=True)
+    brand = Column(String, nullable=True)
+    categories = Column(String, nullable=True)
+    image_url = Column(String, nullable=True)
+    nutriscore = Column(String(1), nullable=True)
@@ -0,0 +1,38 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+# ======================================
+# 🔑 Curseurs de pagination (keyset)
+# ======================================
+# Un curseur est la clé de tri de la dernière ligne d'une page, encodée en
+# base64 ; la page suivante filtre sur (clé) > curseur au lieu d'un OFFSET.
+# Il est renvoyé dans l'en-tête NEXT_CURSOR_HEADER (corps de réponse inchangé).
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)  # UUID, Decimal...
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([_plain(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, *parsers) -> tuple:
+    """Décode un curseur ; chaque valeur passe par le parseur correspondant."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(parsers):
+            raise ValueError(cursor)
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
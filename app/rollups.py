@@ -0,0 +1,110 @@
+import argparse
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import Date, cast, func, select
+from sqlalchemy.orm import Session
+
+from .database import upsert_insert
+from .models import ConsumptionHistory, UserDailyRollup
+
+
+ROLLUP_COUNTERS = ("consumed_count", "wasted_count", "consumed_amount", "wasted_amount")
+
+
+def sql_day(db: Session, column=ConsumptionHistory.created_at):
+    """Jour d'un horodatage côté SQL (SQLite n'a pas de CAST ... AS DATE utilisable)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(column, Date)
+    return func.date(column)
+
+
+# ======================================
+# ➕ Mise à jour incrémentale (même transaction que l'historique)
+# ======================================
+def record_action(db: Session, user_id, action: str, amount: float):
+    """
+    Upsert de la ligne (user, jour courant) : +1 et +amount sur le compteur
+    de l'action. Pas de commit : l'appelant valide avec l'historique.
+    """
+    values = {
+        "user_id": user_id,
+        # Même définition du jour que le backfill : date de la session SQL
+        "day": func.current_date(),
+        "consumed_count": 1 if action == "consumed" else 0,
+        "wasted_count": 1 if action == "wasted" else 0,
+        "consumed_amount": amount if action == "consumed" else 0,
+        "wasted_amount": amount if action == "wasted" else 0,
+    }
+    stmt = upsert_insert(db, UserDailyRollup).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyRollup.user_id, UserDailyRollup.day],
+        set_={c: getattr(UserDailyRollup, c) + getattr(stmt.excluded, c) for c in ROLLUP_COUNTERS},
+    )
+    db.execute(stmt)
+
+
+# ======================================
+# 🔁 Backfill depuis consumption_history
+# ======================================
+def backfill_rollups(db: Session, since: Optional[date] = None, until: Optional[date] = None) -> int:
+    """
+    Recalcule les lignes de rollup de la période à partir de l'historique
+    brut : les lignes existantes de la période sont supprimées (jours dont
+    l'historique a été supprimé ou archivé compris), puis reconstruites en
+    une requête INSERT ... SELECT ... GROUP BY, dans la même transaction.
+    Retourne le nombre de lignes (user, jour).
+    """
+    stale = db.query(UserDailyRollup)
+    if since:
+        stale = stale.filter(UserDailyRollup.day >= since)
+    if until:
+        stale = stale.filter(UserDailyRollup.day <= until)
+    stale.delete(synchronize_session=False)
+
+    day = sql_day(db)
+    consumed = ConsumptionHistory.action == "consumed"
+    wasted = ConsumptionHistory.action == "wasted"
+
+    source = select(
+        ConsumptionHistory.user_id,
+        day.label("day"),
+        func.count(ConsumptionHistory.id).filter(consumed),
+        func.count(ConsumptionHistory.id).filter(wasted),
+        func.coalesce(func.sum(ConsumptionHistory.amount).filter(consumed), 0),
+        func.coalesce(func.sum(ConsumptionHistory.amount).filter(wasted), 0),
+    ).group_by(ConsumptionHistory.user_id, day)
+
+    if since:
+        source = source.where(day >= since)
+    if until:
+        source = source.where(day <= until)
+
+    stmt = upsert_insert(db, UserDailyRollup).from_select(["user_id", "day", *ROLLUP_COUNTERS], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDailyRollup.user_id, UserDailyRollup.day],
+        set_={c: getattr(stmt.excluded, c) for c in ROLLUP_COUNTERS},
+    )
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
+
+
+# ======================================
+# ▶️ Exécution directe
+# ======================================
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Rollups journaliers par utilisateur")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        rows = backfill_rollups(db, since=args.since, until=args.until)
+        print(f"✅ {rows} lignes de rollup recalculées")
+    finally:
+        db.close()
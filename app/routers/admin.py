@@ -1,62 +1,206 @@
-from fastapi import APIRouter, Depends, HTTPException
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..security import get_current_user
+from ..security import get_current_admin, get_current_user
 from .. import models
-from sqlalchemy import func
+from ..pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from sqlalchemy import case, func, select, tuple_
 
 router = APIRouter(prefix="/admin", tags=["Administration"])
 
+# Lignes lues par aller-retour du curseur serveur pendant un export
+EXPORT_BATCH_SIZE = 2000
+EXPORT_COLUMNS = [
+    "id", "email", "full_name", "household_size", "product_count",
+    "consumed", "wasted", "waste_rate", "created_at",
+]
+# Taille de page quand un curseur est donné sans `limit`
+ADMIN_PAGE_SIZE = 100
+# Type de la clé de tri dans un curseur décodé
+SORT_PARSERS = {
+    "created_at": datetime.fromisoformat,
+    "email": str,
+    "product_count": int,
+    "waste_rate": float,
+}
+
+
+def _users_with_counts():
+    """
+    Une seule requête : utilisateurs + agrégats produits / historique
+    calculés par sous-requêtes groupées (LEFT JOIN), au lieu de 3 count()
+    par utilisateur.
+    """
+    Product, History = models.Product, models.ConsumptionHistory
+
+    products = (
+        select(Product.user_id, func.count(Product.id).label("product_count"))
+        .group_by(Product.user_id)
+        .subquery()
+    )
+    history = (
+        select(
+            History.user_id,
+            func.count(History.id).filter(History.action == "consumed").label("consumed"),
+            func.count(History.id).filter(History.action == "wasted").label("wasted"),
+        )
+        .group_by(History.user_id)
+        .subquery()
+    )
+
+    product_count = func.coalesce(products.c.product_count, 0)
+    consumed = func.coalesce(history.c.consumed, 0)
+    wasted = func.coalesce(history.c.wasted, 0)
+    waste_rate = case(
+        (consumed + wasted > 0, wasted * 100.0 / (consumed + wasted)),
+        else_=0.0,
+    )
+
+    return (
+        select(
+            models.User.id,
+            models.User.email,
+            models.User.full_name,
+            models.User.household_size,
+            models.User.created_at,
+            product_count.label("product_count"),
+            consumed.label("consumed"),
+            wasted.label("wasted"),
+            waste_rate.label("waste_rate"),
+        )
+        .outerjoin(products, products.c.user_id == models.User.id)
+        .outerjoin(history, history.c.user_id == models.User.id)
+    )
+
+
 @router.get("/users")
-def get_all_users(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_all_users(
+    response: Response,
+    email_prefix: str | None = Query(None, description="Filtre sur le début de l'email"),
+    sort: Literal["created_at", "email", "product_count", "waste_rate"] = Query("created_at"),
+    order: Literal["asc", "desc"] = Query("asc"),
+    limit: int | None = Query(
+        None, ge=1, le=1000, description="Taille de page (sans limit ni cursor : tous les utilisateurs)"
+    ),
+    cursor: str | None = Query(None, description="Valeur de l'en-tête X-Next-Cursor de la page précédente"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     """
-    Renvoie la liste de tous les utilisateurs avec :
+    Renvoie la liste des utilisateurs avec :
     - nombre de produits
     - consommés
     - gaspillés
+    - taux de gaspillage
+
+    Sans `limit` ni `cursor` : tous les utilisateurs, comme avant la
+    pagination. Sinon pagination par curseur (clé de tri, id) : 1 requête
+    par page quel que soit le nombre d'utilisateurs. Le curseur de la page
+    suivante est renvoyé dans l'en-tête X-Next-Cursor (absent sur la
+    dernière page).
     """
+    query = _users_with_counts()
+    if email_prefix:
+        query = query.where(models.User.email.startswith(email_prefix, autoescape=True))
 
-    users = db.query(models.User).all()
-    results = []
+    rows = query.subquery()
+    key = (rows.c[sort], rows.c.id)
+    stmt = select(rows)
 
-    for u in users:
+    if cursor:
+        bound = tuple_(*decode_cursor(cursor, SORT_PARSERS[sort], uuid.UUID))
+        stmt = stmt.where(tuple_(*key) < bound if order == "desc" else tuple_(*key) > bound)
 
-        # Nombre total de produits
-        product_count = (
-            db.query(models.Product)
-            .filter(models.Product.user_id == u.id)
-            .count()
-        )
+    if order == "desc":
+        stmt = stmt.order_by(key[0].desc(), key[1].desc())
+    else:
+        stmt = stmt.order_by(*key)
 
-        # Consommé
-        consumed = (
-            db.query(models.ConsumptionHistory)
-            .filter(models.ConsumptionHistory.user_id == u.id, 
-                    models.ConsumptionHistory.action == "consumed")
-            .count()
-        )
+    if limit is None and cursor is None:
+        return [_user_row(u) for u in db.execute(stmt).mappings()]
+
+    limit = limit or ADMIN_PAGE_SIZE
+    page = db.execute(stmt.limit(limit + 1)).mappings().all()
+    if len(page) > limit:
+        page = page[:limit]
+        last = page[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last[sort], last["id"])
+
+    return [_user_row(u) for u in page]
+
+
+# ============================
+# 📤 Export en streaming (CSV / NDJSON)
+# ============================
+@router.get("/users/export")
+def export_users(
+    fmt: Literal["csv", "ndjson"] = Query("csv", alias="format"),
+    email_prefix: str | None = Query(None, description="Filtre sur le début de l'email"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_admin),
+):
+    """
+    Même contenu que /admin/users, sans pagination, envoyé au fil de la
+    lecture : curseur côté serveur (stream_results) et blocs de
+    EXPORT_BATCH_SIZE lignes, donc mémoire bornée quel que soit le volume.
+    Export en masse de données personnelles : administrateurs uniquement
+    (ADMIN_EMAILS).
+    """
+    query = _users_with_counts().order_by(models.User.id)
+    if email_prefix:
+        query = query.where(models.User.email.startswith(email_prefix, autoescape=True))
+
+    # La session de la requête est fermée avant la fin du streaming :
+    # le générateur ouvre sa propre connexion sur le même moteur
+    engine = db.get_bind()
+    encode = _csv_lines if fmt == "csv" else _ndjson_lines
+
+    def stream():
+        with engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, yield_per=EXPORT_BATCH_SIZE
+            ).execute(query).mappings()
+            if fmt == "csv":
+                yield _csv_lines([dict(zip(EXPORT_COLUMNS, EXPORT_COLUMNS))])
+            for batch in result.partitions():
+                yield encode([_user_row(u) for u in batch])
+
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{fmt}"'},
+    )
+
+
+def _user_row(u) -> dict:
+    return {
+        "id": str(u["id"]),
+        "email": u["email"],
+        "full_name": u["full_name"],
+        "household_size": u["household_size"],
+        "product_count": u["product_count"],
+        "consumed": u["consumed"],
+        "wasted": u["wasted"],
+        "waste_rate": round(float(u["waste_rate"]), 1),
+        "created_at": u["created_at"],
+    }
+
+
+def _csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writerows(rows)
+    return buffer.getvalue()
 
-        # Gaspillé
-        wasted = (
-            db.query(models.ConsumptionHistory)
-            .filter(models.ConsumptionHistory.user_id == u.id, 
-                    models.ConsumptionHistory.action == "wasted")
-            .count()
-        )
 
-        # Taux gaspillage
-        rate = (wasted / (consumed + wasted) * 100) if (consumed + wasted) > 0 else 0
-
-        results.append({
-            "id": str(u.id),
-            "email": u.email,
-            "full_name": u.full_name,
-            "household_size": u.household_size,
-            "product_count": product_count,
-            "consumed": consumed,
-            "wasted": wasted,
-            "waste_rate": round(rate, 1),
-            "created_at": u.created_at
-        })
-
-    return results
+def _ndjson_lines(rows) -> str:
+    return "".join(json.dumps(row, default=str) + "\n" for row in rows)
@@ -3,44 +3,54 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..security import get_current_user
 from .. import models
-from datetime import date
+from ..ml.predictor import status_from_dates
+from datetime import date, timedelta
 
 router = APIRouter(prefix="/alerts", tags=["Alertes"])
 
+# Fenêtre d'alerte : produits périmés ou expirant dans ALERT_DAYS jours
+ALERT_DAYS = 2
+
 @router.get("/")
 def get_alerts(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     """
     Renvoie tous les produits proches de la date d'expiration :
     - days_left < 0  = périmé
     - days_left <= 2 = alerte
+
+    Fenêtre et tri (périmé d'abord) faits en SQL : un parcours de l'index
+    (user_id, expiration_date). Le message est recalculé à partir des dates
+    (comme /products), pas lu dans la colonne stockée, figée au dernier calcul.
     """
 
     today = date.today()
 
-    products = (
-        db.query(models.Product)
-        .filter(models.Product.user_id == current_user.id)
+    rows = (
+        db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.expiration_date,
+            models.Product.at_risk_from,
+            models.Category.name.label("category"),
+        )
+        .outerjoin(models.Category, models.Category.id == models.Product.category_id)
+        .filter(
+            models.Product.user_id == current_user.id,
+            models.Product.expiration_date <= today + timedelta(days=ALERT_DAYS),
+        )
+        .order_by(models.Product.expiration_date, models.Product.id)
         .all()
     )
 
-    results = []
-    for p in products:
-        if p.expiration_date:
-            days_left = (p.expiration_date - today).days
-        else:
-            days_left = None
-
-        if days_left is not None and days_left <= 2:
-            results.append({
-                "id": str(p.id),
-                "name": p.name,
-                "category": p.category,
-                "days_left": days_left,
-                "expiration_date": p.expiration_date,
-                "message": p.message
-            })
-
-    # Trier : périmé d’abord
-    results = sorted(results, key=lambda x: x["days_left"])
-
-    return results
+    alerts = []
+    for p in rows:
+        days_left, _, message = status_from_dates(p.expiration_date, p.at_risk_from, today)
+        alerts.append({
+            "id": str(p.id),
+            "name": p.name,
+            "category": p.category,
+            "days_left": days_left,
+            "expiration_date": p.expiration_date,
+            "message": message,
+        })
+    return alerts
@@ -1,28 +1,119 @@
 # routes/barcode.py
-import requests
-from fastapi import APIRouter, HTTPException
+import os
+from typing import Annotated, List
+
+from fastapi import APIRouter, Depends, HTTPException, Path
+from pydantic import BaseModel, Field, StringConstraints
+from sqlalchemy.orm import Session
+from app.api_clients.cache import cached_fetch, cached_fetch_many
+from app.api_clients.http import http_session
+from app.api_clients.off_index import lookup, lookup_many
+from app.database import get_db
+from app.security import get_current_user
 
 router = APIRouter(prefix="/barcode", tags=["Barcode"])
 
-@router.get("/{code}")
-def get_product_from_barcode(code: str):
-    url = f"https://world.openfoodfacts.org/api/v0/product/{code}.json"
-    res = requests.get(url)
+# Codes par requête /barcode/batch et appels OpenFoodFacts simultanés par lot
+BARCODE_BATCH_MAX = 100
+BARCODE_BATCH_CONCURRENCY = int(os.getenv("BARCODE_BATCH_CONCURRENCY", "8"))
 
-    if res.status_code != 200:
-        raise HTTPException(404, "Produit introuvable")
+# Codes EAN-8 à EAN-14 : chiffres uniquement, seuls insérés dans l'URL
+# OpenFoodFacts et dans le cache (ni "/", "?", "#" ni "..")
+BARCODE_PATTERN = r"^\d{8,14}$"
 
-    data = res.json()
+# Échec réseau / API (≠ produit inconnu, qui est mis en cache)
+_UNAVAILABLE = object()
 
+
+def fetch_barcode(code: str):
+    """Fiche OpenFoodFacts (sans cache) ; None si le code est inconnu."""
+    url = f"https://world.openfoodfacts.org/api/v0/product/{code}.json"
+    res = http_session.get(url)
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
+
+    data = res.json()
     if data.get("status") != 1:
-        raise HTTPException(404, "Produit non trouvé dans OpenFoodFacts")
+        return None
 
     product = data["product"]
-
     return {
-        "barcode": code,
         "name": product.get("product_name"),
         "brand": product.get("brands"),
         "category": product.get("categories"),
         "image": product.get("image_front_url"),
+        "nutriscore": product.get("nutriscore_grade"),
+    }
+
+
+Barcode = Annotated[str, StringConstraints(strip_whitespace=True, pattern=BARCODE_PATTERN)]
+
+
+class BarcodeBatch(BaseModel):
+    # Un code invalide rejette tout le lot (422) avant index, cache ou appel sortant
+    codes: List[Barcode] = Field(..., min_length=1, max_length=BARCODE_BATCH_MAX)
+
+
+@router.post("/batch")
+def get_products_from_barcodes(
+    payload: BarcodeBatch,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Résout un sac de courses en une requête : codes dédoublonnés, index
+    local et cache lus en une requête chacun sur la session de la requête,
+    puis OpenFoodFacts en parallèle (au plus BARCODE_BATCH_CONCURRENCY
+    appels simultanés) pour les codes restants, écrits en un seul upsert.
+    Un résultat par code distinct, dans l'ordre d'envoi, erreurs incluses.
+    Réservé aux utilisateurs connectés : un lot peut déclencher jusqu'à
+    BARCODE_BATCH_MAX appels OpenFoodFacts et autant de lignes de cache.
+    """
+    codes = list(dict.fromkeys(payload.codes))
+    products = lookup_many(db, codes)
+
+    remaining = [c for c in codes if c not in products]
+    fetched = cached_fetch_many(
+        db, "off_barcode", remaining, lambda code: fetch_barcode(code),
+        default=_UNAVAILABLE, limit=BARCODE_BATCH_CONCURRENCY,
+    )
+
+    results = []
+    for code in codes:
+        product = products.get(code, fetched.get(code))
+        if product is _UNAVAILABLE:
+            results.append({"barcode": code, "status": "error", "error": "OpenFoodFacts indisponible"})
+        elif product is None:
+            results.append({"barcode": code, "status": "not_found", "error": "Produit non trouvé dans OpenFoodFacts"})
+        else:
+            results.append({"barcode": code, "status": "ok", "product": {"barcode": code, **product}})
+
+    return {
+        "results": results,
+        "found": sum(r["status"] == "ok" for r in results),
+        "missing": sum(r["status"] != "ok" for r in results),
     }
+
+
+@router.get("/{code}")
+def get_product_from_barcode(
+    code: str = Path(..., pattern=BARCODE_PATTERN, description="Code-barres (8 à 14 chiffres)"),
+    db: Session = Depends(get_db),
+):
+
+    # Index local (import de l'export OpenFoodFacts) ; l'API seulement en cas d'absence
+    product = lookup(db, code)
+    if product is not None:
+        return {"barcode": code, **product}
+
+    product = cached_fetch(db, "off_barcode", code, lambda: fetch_barcode(code), default=_UNAVAILABLE)
+
+    if product is _UNAVAILABLE:
+        # Rien en cache et OpenFoodFacts injoignable : réessayable, pas un 404
+        raise HTTPException(503, "OpenFoodFacts indisponible, réessayer plus tard")
+
+    if product is None:
+        raise HTTPException(404, "Produit non trouvé dans OpenFoodFacts")
+
+    return {"barcode": code, **product}
@@ -1,4 +1,5 @@
-import requests
+from app.api_clients.cache import cached_fetch, own_session
+from app.api_clients.http import http_session, fan_out
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from uuid import UUID
@@ -173,7 +174,7 @@ def translate_to_english(text: str) -> str:
         return text
 
     try:
-        r = requests.post(
+        r = http_session.post(
             "https://libretranslate.de/translate",
             json={
                 "q": text,
@@ -195,61 +196,66 @@ def normalize_name(name: str) -> str:
 # ============================
 # 🥗 Nutriscore (OpenFoodFacts)
 # ============================
-def get_nutriscore(product_name: str):
-    try:
-        params = {
-            "search_terms": product_name,
-            "search_simple": 1,
-            "action": "process",
-            "json": 1,
-        }
-        r = requests.get(
-            "https://world.openfoodfacts.org/cgi/search.pl",
-            params=params,
-            timeout=6,
-        ).json()
-
-        products = r.get("products", [])
-        if not products:
-            return None
-
-        p = products[0]
-
-        return {
-            "product_name": p.get("product_name", product_name),
-            "nutriscore_grade": p.get("nutriscore_grade", "unknown"),
-            "nutriscore_score": p.get("nutriscore_score"),
-            "image": p.get("image_front_small_url"),
-        }
-
-    except:
+def fetch_nutriscore(product_name: str):
+    """Recherche OpenFoodFacts (sans cache) ; lève une exception si l'API échoue."""
+    params = {
+        "search_terms": product_name,
+        "search_simple": 1,
+        "action": "process",
+        "json": 1,
+    }
+    r = http_session.get(
+        "https://world.openfoodfacts.org/cgi/search.pl",
+        params=params,
+        timeout=6,
+    )
+    r.raise_for_status()
+
+    products = r.json().get("products", [])
+    if not products:
         return None
 
+    p = products[0]
+
+    return {
+        "product_name": p.get("product_name", product_name),
+        "nutriscore_grade": p.get("nutriscore_grade", "unknown"),
+        "nutriscore_score": p.get("nutriscore_score"),
+        "image": p.get("image_front_small_url"),
+    }
+
+
+def get_nutriscore(product_name: str, db: Session):
+    return cached_fetch(db, "off_search", product_name, lambda: fetch_nutriscore(product_name))
+
 
 # ============================
 # 🍽 API recettes (TheMealDB)
 # ============================
-def get_recipes(product_name: str):
-    try:
-        url = f"https://www.themealdb.com/api/json/v1/1/search.php?s={product_name}"
-        meals = requests.get(url, timeout=6).json().get("meals")
+def fetch_recipes(product_name: str):
+    """Recherche TheMealDB (sans cache) ; lève une exception si l'API échoue."""
+    url = f"https://www.themealdb.com/api/json/v1/1/search.php?s={product_name}"
+    r = http_session.get(url, timeout=6)
+    r.raise_for_status()
+    meals = r.json().get("meals")
+
+    if not meals:
+        return []
 
-        if not meals:
-            return []
+    recipes = []
+    for m in meals:  # 👉 ICI : PAS DE LIMITE
+        recipes.append({
+            "id": m["idMeal"],
+            "title": m["strMeal"],
+            "thumbnail": m["strMealThumb"],
+            "link": f"https://www.themealdb.com/meal/{m['idMeal']}",
+        })
 
-        recipes = []
-        for m in meals:  # 👉 ICI : PAS DE LIMITE
-            recipes.append({
-                "id": m["idMeal"],
-                "title": m["strMeal"],
-                "thumbnail": m["strMealThumb"],
-                "link": f"https://www.themealdb.com/meal/{m['idMeal']}",
-            })
+    return recipes
 
-        return recipes
 
-    except:
-        return []
+def get_recipes(product_name: str, db: Session):
+    return cached_fetch(db, "mealdb_search", product_name, lambda: fetch_recipes(product_name), default=[])
 
 
 # ============================
@@ -274,15 +280,23 @@ def external_data(
 
     print("🔍 Nom brut:", raw_name, "// Nom recherché:", search_name)
 
-    # Nutriscore → basé sur search_name
-    nutri = get_nutriscore(search_name)
+    # Nutriscore + recettes → basés sur search_name, en parallèle
+    # (une session par thread pour lire / écrire le cache)
+    new_session = own_session(db)
+
+    def nutriscore():
+        with new_session() as s:
+            return get_nutriscore(search_name, s)
+
+    def recipes():
+        with new_session() as s:
+            return get_recipes(search_name, s)
 
-    # Recettes → basé sur search_name
-    recipes = get_recipes(search_name)
+    results = fan_out({"nutriscore": nutriscore, "recipes": recipes})
 
     return {
         "product_id": str(product.id),
         "product_name": search_name,
-        "nutriscore": nutri,
-        "recipes": recipes
+        "nutriscore": results["nutriscore"],
+        "recipes": results["recipes"]
     }
@@ -1,29 +1,82 @@
-from fastapi import APIRouter, Depends
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import and_, func, tuple_
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import ConsumptionHistory, Product
+from app.models import Category, ConsumptionHistory, Product
+from app.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
 from app.security import get_current_user
 
 router = APIRouter(prefix="/history", tags=["Historique"])
 
 @router.get("/")
-def get_history(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    records = (
-        db.query(ConsumptionHistory)
+def get_history(
+    response: Response,
+    action: Literal["consumed", "wasted"] | None = Query(None),
+    start: date | None = Query(None, description="Premier jour inclus (YYYY-MM-DD)"),
+    end: date | None = Query(None, description="Dernier jour inclus (YYYY-MM-DD)"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None, description="Valeur de l'en-tête X-Next-Cursor de la page précédente"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Historique du plus récent au plus ancien. Nom du produit et catégorie
+    sont copiés dans chaque ligne à l'écriture : ils restent affichés après
+    suppression du produit. Les lignes antérieures à la copie (non reprises
+    par `backfill-history-names`) retombent sur le produit encore existant :
+    la jointure ne porte que sur elles. Pagination par curseur sur
+    (created_at, id), renvoyé dans l'en-tête X-Next-Cursor.
+    """
+    query = (
+        db.query(
+            ConsumptionHistory.id,
+            ConsumptionHistory.action,
+            ConsumptionHistory.amount,
+            ConsumptionHistory.created_at,
+            func.coalesce(ConsumptionHistory.product_name, Product.name, "Produit supprimé").label("product_name"),
+            func.coalesce(ConsumptionHistory.category_name, Category.name).label("category_name"),
+        )
+        .outerjoin(Product, and_(
+            ConsumptionHistory.product_name.is_(None),
+            Product.id == ConsumptionHistory.product_id,
+        ))
+        .outerjoin(Category, Category.id == Product.category_id)
         .filter(ConsumptionHistory.user_id == current_user.id)
-        .order_by(ConsumptionHistory.created_at.desc())
+    )
+
+    if action:
+        query = query.filter(ConsumptionHistory.action == action)
+    if start:
+        query = query.filter(ConsumptionHistory.created_at >= start)
+    if end:
+        query = query.filter(ConsumptionHistory.created_at < end + timedelta(days=1))
+    if cursor:
+        bound = decode_cursor(cursor, datetime.fromisoformat, uuid.UUID)
+        query = query.filter(
+            tuple_(ConsumptionHistory.created_at, ConsumptionHistory.id) < tuple_(*bound)
+        )
+
+    records = (
+        query.order_by(ConsumptionHistory.created_at.desc(), ConsumptionHistory.id.desc())
+        .limit(limit + 1)
         .all()
     )
+    if len(records) > limit:
+        records = records[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(records[-1].created_at, records[-1].id)
 
-    results = []
-    for r in records:
-        product = db.query(Product).filter(Product.id == r.product_id).first()
-        results.append({
+    return [
+        {
             "id": str(r.id),
             "action": r.action,
             "amount": float(r.amount),
             "created_at": r.created_at,
-            "product_name": product.name if product else "Produit supprimé"
-        })
-
-    return results
+            "product_name": r.product_name,
+            "category_name": r.category_name,
+        }
+        for r in records
+    ]
@@ -1,19 +1,28 @@
 # --- Imports nécessaires ---
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Product
-import joblib
-import os
-import numpy as np
 from uuid import UUID
 from datetime import datetime, date
 from ..schemas import ProductCreate, ProductOut
 from .. import models
 from typing import List
 from ..security import get_current_user
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from app.email_utils import send_email
+from app.routers.external_data import get_recipes, normalize_name
+from app.rollups import record_action
+from app.daily_stats import record_daily_stats, backfill_daily_stats
+from app.history_archive import archive_history, HISTORY_RETENTION_MONTHS
+from app.ml.registry import model_registry
+from app.ml.store import model_store
+from app.ml.shadow import shadow_stats
+from app.ml.predictor import (
+    get_predictions_and_messages, assess_product, STATUS_CLAUSES, expired_clause, at_risk_clause,
+)
+from app.ml.refresh import refresh_predictions, REFRESH_CHUNK_SIZE
 
 
 
@@ -24,53 +33,33 @@ class ProductAction(BaseModel):
 router = APIRouter(prefix="/products", tags=["Products"])
 
 
-# ============================
-# 🔥 Charger le modèle ML
-# ============================
-MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../ml/models/waste_predictor.joblib"))
-
-
-def load_ml_model():
-    if os.path.exists(MODEL_PATH):
-        try:
-            return joblib.load(MODEL_PATH)
-        except Exception:
-            return None
-    return None
-
-
 # ============================
 # 🔮 Fonction de prédiction ML
 # ============================
 def get_prediction_and_message(product: models.Product):
-    today = date.today()
-
-    days_left = (product.expiration_date - today).days if product.expiration_date else None
-
-    # ---- CAS 1 : périmé ----
-    if days_left is not None and days_left < 0:
-        return days_left, 2, "⚠️ Produit périmé"
+    """(days_left, prediction, message) pour un produit — voir app.ml.predictor."""
+    return get_predictions_and_messages([product])[0]
 
-    # ---- Charger modèle ----
-    model = load_ml_model()
-    prediction = None
 
-    # ---- CAS 2 : prédiction ML ----
-    if model and days_left is not None:
-        try:
-            X = np.array([[float(product.quantity), days_left]])
-            prediction = int(model.predict(X)[0])
-        except:
-            prediction = None
-
-    # ---- CAS 3 : risque ----
-    # - modèle ML dit 1
-    # - ou ≤ 3 jours restants
-    if (prediction == 1) or (days_left is not None and days_left <= 3):
-        return days_left, 1, "🔥 Produit à risque de gaspillage"
-
-    # ---- CAS 4 : sûr ----
-    return days_left, 0, "✅ Produit sûr"
+# ============================
+# 🧾 Ligne d'historique
+# ============================
+def history_entry(user_id, product: models.Product, action: str, amount: float):
+    """
+    Action sur un produit, avec copie de son nom, de sa catégorie et des
+    features du modèle (quantité détenue, date d'expiration) : à appeler
+    avant de modifier la quantité.
+    """
+    return models.ConsumptionHistory(
+        user_id=user_id,
+        product_id=product.id,
+        action=action,
+        amount=amount,
+        product_name=product.name,
+        category_name=product.category_rel.name if product.category_rel else None,
+        product_quantity=product.quantity,
+        product_expiration_date=product.expiration_date,
+    )
 
 
 
@@ -98,9 +87,8 @@ def add_product(
     )
 
 
-    days_left, pred, msg = get_prediction_and_message(product)
-    product.prediction = pred
-    product.message = msg
+    # Date de passage à risque calculée une fois, à la création
+    assess_product(product)
 
     db.add(product)
     db.commit()
@@ -114,13 +102,19 @@ def add_product(
 # ============================
 @router.get("/", response_model=List[dict])
 def list_products(
+    status_filter: str | None = Query(None, alias="status", pattern="^(expired|at_risk|safe)$"),
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
     
 ):
+    query = db.query(models.Product).filter(models.Product.user_id == user.id)
+
+    # Filtre de statut poussé en SQL (index user_id, at_risk_from)
+    if status_filter:
+        query = query.filter(STATUS_CLAUSES[status_filter](date.today()))
+
     products = (
-        db.query(models.Product)
-        .filter(models.Product.user_id == user.id)
+        query
         .order_by(
             models.Product.expiration_date.is_(None),
             models.Product.expiration_date,
@@ -128,10 +122,12 @@ def list_products(
         .all()
     )
 
-    enriched = []
-    for p in products:
-        days_left, pred, msg = get_prediction_and_message(p)
+    # Statut par comparaison de dates (modèle appelé en lot seulement
+    # pour les produits sans at_risk_from)
+    predictions = get_predictions_and_messages(products)
 
+    enriched = []
+    for p, (days_left, pred, msg) in zip(products, predictions):
         enriched.append(
             {
                 "id": str(p.id),
@@ -231,29 +227,20 @@ def consume_product(
     if payload.amount <= 0 or payload.amount > float(p.quantity):
         raise HTTPException(400, "Quantité invalide")
 
+    # Historique (avant la mise à jour : copie de la quantité détenue au moment de l'action)
+    db.add(history_entry(user.id, p, "consumed", payload.amount))
     p.quantity = float(p.quantity) - payload.amount
 
-    # Historique
-    db.add(
-        models.ConsumptionHistory(
-            user_id=user.id,
-            product_id=p.id,
-            action="consumed",
-            amount=payload.amount,
-        )
-    )
+    # Rollup journalier mis à jour dans la même transaction
+    record_action(db, user.id, "consumed", payload.amount)
 
     if p.quantity <= 0:
         db.delete(p)
         db.commit()
         return {"status": "deleted", "message": "Produit consommé"}
 
-    db.commit()
-    db.refresh(p)
-
-    days_left, pred, msg = get_prediction_and_message(p)
-    p.prediction = pred
-    p.message = msg
+    # La quantité a changé : on recalcule la date de passage à risque
+    days_left, pred, msg = assess_product(p)
 
     db.commit()
     db.refresh(p)
@@ -291,28 +278,20 @@ def waste_product(
     if payload.amount <= 0 or payload.amount > float(p.quantity):
         raise HTTPException(400, "Quantité invalide")
     
+    # Historique (avant la mise à jour : copie de la quantité détenue au moment de l'action)
+    db.add(history_entry(user.id, p, "wasted", payload.amount))
     p.quantity = float(p.quantity) - payload.amount
 
-    db.add(
-        models.ConsumptionHistory(
-            user_id=user.id,
-            product_id=p.id,
-            action="wasted",
-            amount=payload.amount,
-        )
-    )
+    # Rollup journalier mis à jour dans la même transaction
+    record_action(db, user.id, "wasted", payload.amount)
 
     if p.quantity <= 0:
         db.delete(p)
         db.commit()
         return {"status": "deleted", "message": "Produit gaspillé"}
 
-    db.commit()
-    db.refresh(p)
-
-    days_left, pred, msg = get_prediction_and_message(p)
-    p.prediction = pred
-    p.message = msg
+    # La quantité a changé : on recalcule la date de passage à risque
+    days_left, pred, msg = assess_product(p)
 
     db.commit()
     db.refresh(p)
@@ -332,114 +311,111 @@ def waste_product(
 # 🚀 Rafraîchissement interne
 # ============================
 @router.post("/internal/refresh", tags=["internal"])
-def internal_refresh_predictions(db: Session = Depends(get_db)):
-    model = load_ml_model()
-    today = date.today()
-
-    products = db.query(models.Product).all()
-    updated = 0
-
-    for p in products:
-        days_left = (
-            (p.expiration_date - today).days
-            if p.expiration_date else None
-        )
-
-        # Périmé
-        if days_left is None:
-            p.prediction = 0
-            p.message = "✅ Produit sûr"
-
-        elif days_left < 0:
-            p.prediction = 2
-            p.message = "⚠️ Produit périmé"
-
-        elif model:
-            try:
-                X = np.array([[float(p.quantity), days_left]])
-                pred = int(model.predict(X)[0])
-                if pred == 1 or days_left <= 3:
-                    p.prediction = 1
-                    p.message = "🔥 Produit à risque de gaspillage"
-                else:
-                    p.prediction = 0
-                    p.message = "✅ Produit sûr"
-            except Exception:
-                p.prediction = 0
-                p.message = "✅ Produit sûr"
-
-        else:
-            if days_left <= 3:
-                p.prediction = 1
-                p.message = "🔥 Produit à risque"
-            else:
-                p.prediction = 0
-                p.message = "✅ Produit sûr"
-
-        updated += 1
-
-    db.commit()
-    return {"status": "ok", "updated": updated}
+def internal_refresh_predictions(
+    chunk_size: int = Query(REFRESH_CHUNK_SIZE, ge=100, le=50000),
+    full: bool = Query(False, description="Recalculer tous les produits, pas seulement les obsolètes"),
+    db: Session = Depends(get_db),
+):
+    """
+    Rafraîchissement dans ce processus. Le job partitionné multi-processus
+    (python -m app.ml.refresh --workers N) ne se lance pas depuis un worker
+    HTTP : il forkerait un processus qui détient des connexions du pool.
+    """
+    report = refresh_predictions(db, chunk_size=chunk_size, full=full)
+    # "updated" conservé pour les appelants existants (= lignes modifiées)
+    return {"status": "ok", "updated": report["changed"], **report}
 
 
 # ============================
-# 📊 Stats journalières internes
+# 🧠 Modèle chargé (version / date de chargement)
 # ============================
-@router.post("/internal/stats", tags=["internal"])
-def record_daily_stats(db: Session = Depends(get_db)):
-    today = date.today()
-
-    products = db.query(models.Product).all()
+class PromoteRequest(BaseModel):
+    version: str
 
-    expired = risky = safe = 0
 
-    for p in products:
-        if not p.expiration_date:
-            safe += 1
-            continue
+class ShadowRequest(BaseModel):
+    version: str
+    sample_rate: float = Field(0.1, gt=0, le=1)
 
-        days_left = (p.expiration_date - today).days
 
-        if days_left < 0:
-            expired += 1
-        elif days_left <= 3:
-            risky += 1
-        else:
-            safe += 1
+@router.get("/internal/model", tags=["internal"])
+def model_info():
+    manifest = model_store.read_manifest()
+    return {
+        **model_registry.info(),
+        "store": {"active": manifest.get("active"), "versions": manifest.get("versions", {})},
+        "shadow_stats": shadow_stats.snapshot(),
+    }
 
-    total = len(products)
 
-    existing = db.query(models.DailyStats).filter(
-        models.DailyStats.stat_date == today
-    ).first()
+@router.post("/internal/model/promote", tags=["internal"])
+def promote_model(payload: PromoteRequest):
+    if payload.version not in model_store.versions():
+        raise HTTPException(404, "Version de modèle introuvable")
 
-    if existing:
-        existing.total_products = total
-        existing.expired = expired
-        existing.risky = risky
-        existing.safe = safe
-    else:
-        db.add(
-            models.DailyStats(
-                stat_date=today,
-                total_products=total,
-                expired=expired,
-                risky=risky,
-                safe=safe,
-            )
-        )
+    # Chargement + compilation + table + préchauffage AVANT de servir
+    try:
+        loaded = model_registry.load_version(payload.version)
+    except Exception as e:
+        raise HTTPException(400, f"Chargement du modèle impossible : {e}")
 
-    db.commit()
+    model_store.promote(payload.version)
+    model_registry.install(loaded)
 
     return {
-        "stat_date": today.isoformat(),
-        "expired": expired,
-        "risky": risky,
-        "safe": safe,
-        "total": total,
         "status": "ok",
+        "version": loaded.version,
+        "loaded_at": loaded.loaded_at.isoformat(),
     }
 
+
+@router.post("/internal/model/shadow", tags=["internal"])
+def start_shadow(payload: ShadowRequest):
+    try:
+        model_store.set_shadow(payload.version, payload.sample_rate)
+    except KeyError:
+        raise HTTPException(404, "Version de modèle introuvable")
+    model_registry.recheck()
+    return {"status": "ok", "shadow": model_registry.info()["shadow"]}
+
+
+@router.delete("/internal/model/shadow", tags=["internal"])
+def stop_shadow():
+    model_store.set_shadow(None)
+    model_registry.recheck()
+    return {"status": "ok", "shadow": None}
+
+
+# ============================
+# 📊 Stats journalières internes
+# ============================
+@router.post("/internal/stats", tags=["internal"])
+def record_daily_stats_endpoint(
+    since: date | None = Query(None, description="Backfill : premier jour à régénérer"),
+    until: date | None = Query(None, description="Backfill : dernier jour (défaut : aujourd'hui)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Statistiques du jour (globales + par catégorie + par utilisateur),
+    calculées en SQL. Avec `since`, régénère toute la période.
+    """
+    if since:
+        days = backfill_daily_stats(db, since, until)
+        return {"status": "ok", "days": len(days), "stats": days}
+
+    return {**record_daily_stats(db), "status": "ok"}
+
+
+# ============================
+# 🗄️ Archivage de l'historique
+# ============================
+@router.post("/internal/archive_history", tags=["internal"])
+def archive_history_endpoint(
+    retention_months: int = Query(HISTORY_RETENTION_MONTHS, ge=1, description="Mois d'historique brut conservés"),
+    db: Session = Depends(get_db),
+):
+    return {**archive_history(db, retention_months=retention_months), "status": "ok"}
+
    # ⬅️ adapte l'import à ton projet
 
 
@@ -450,35 +426,26 @@ def send_risk_alerts(db: Session = Depends(get_db)):
     total_alerts_sent = 0
 
     for user in users:
-        products = (
+        # Périmés ou à risque : simple comparaison de dates en SQL
+        risky = (
             db.query(models.Product)
-            .filter(models.Product.user_id == user.id)
+            .filter(
+                models.Product.user_id == user.id,
+                or_(expired_clause(today), at_risk_clause(today)),
+            )
+            .order_by(models.Product.expiration_date)
             .all()
         )
 
-        risky = []
-        for p in products:
-            if not p.expiration_date:
-                continue
-            days_left = (p.expiration_date - today).days
-            if p.prediction == 1 or days_left <= 3:
-                risky.append(p)
-
         if not risky:
             continue
 
         # On choisit le premier produit pour proposer des recettes
         main_product = risky[0]
 
-        # 🔵 Appel à ton API existante pour récupérer les recettes
-        try:
-            r = requests.get(
-                f"http://api:8000/external-data/{main_product.id}",
-                timeout=5
-            )
-            recipes = r.json().get("recipes", [])
-        except:
-            recipes = []
+        # 🔵 Recettes : même recherche que /external-data, sans repasser par HTTP
+        # (l'appel à soi-même n'était pas authentifié et ne renvoyait jamais rien)
+        recipes = get_recipes(normalize_name(main_product.name), db)
 
         # 🔵 Construire la liste des produits à risque
         product_list = "".join(
@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from calendar import monthrange
+from typing import Literal
 
 from app.database import get_db
 from ..security import get_current_user
 
-from app.models import Product, ConsumptionHistory, User
+from app.models import Product, User, UserDailyRollup
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
+# Borne du nombre de points renvoyés par /stats/timeseries (~10 ans en jours)
+MAX_SERIES_POINTS = 3700
+
 
 @router.get("/overview")
 def stats_overview(
@@ -20,7 +25,9 @@ def stats_overview(
     current_user: User = Depends(get_current_user),
 ):
     """
-    Retourne les statistiques globales + tendances journalières optionnelles
+    Retourne les statistiques globales + tendances journalières optionnelles.
+    Tout est agrégé en SQL : 2 requêtes quel que soit le volume d'historique
+    (consommés / gaspillés lus dans user_daily_rollup).
     """
 
     # ==========================================================
@@ -28,73 +35,68 @@ def stats_overview(
     # ==========================================================
     start_date = None
     end_date = None
+    next_start = None
 
     if month:
         try:
             year, m = map(int, month.split("-"))
             start_date = date(year, m, 1)
             end_date = date(year, m, monthrange(year, m)[1])
+            # Borne exclusive : inclut toute la journée du dernier jour du mois
+            next_start = end_date + timedelta(days=1)
         except Exception:
             return {"error": "Format de mois invalide. Utilisez YYYY-MM"}
 
     # ==========================================================
-    # 📦 PRODUITS DU FOYER
+    # 📦 PRODUITS DU FOYER (+ EXPIRÉS) — 1 requête agrégée
     # ==========================================================
-    products_query = db.query(Product).filter(
-        Product.user_id == current_user.id
-    )
+    products_query = db.query(
+        func.count(Product.id),
+        func.count(Product.id).filter(Product.expiration_date < date.today()),
+    ).filter(Product.user_id == current_user.id)
 
     if start_date:
         products_query = products_query.filter(
             Product.created_at >= start_date,
-            Product.created_at <= end_date,
+            Product.created_at < next_start,
         )
 
-    products = products_query.all()
-    total_products = len(products)
+    total_products, expired = products_query.one()
 
     # ==========================================================
-    # 🟢 CONSOMMÉS
+    # 🟢🔴 CONSOMMÉS / GASPILLÉS (+ TENDANCE) — lus dans le rollup
+    # journalier (une ligne par jour actif, pas de scan d'historique)
     # ==========================================================
-    consumed_query = db.query(ConsumptionHistory).filter(
-        ConsumptionHistory.user_id == current_user.id,
-        ConsumptionHistory.action == "consumed",
-    )
-
-    if start_date:
-        consumed_query = consumed_query.filter(
-            ConsumptionHistory.created_at >= start_date,
-            ConsumptionHistory.created_at <= end_date,
-        )
-
-    consumed = consumed_query.count()
-
-    # ==========================================================
-    # 🔴 GASPILLÉS
-    # ==========================================================
-    wasted_query = db.query(ConsumptionHistory).filter(
-        ConsumptionHistory.user_id == current_user.id,
-        ConsumptionHistory.action == "wasted",
-    )
+    rollup_filters = [UserDailyRollup.user_id == current_user.id]
+    daily_trend = []
 
     if start_date:
-        wasted_query = wasted_query.filter(
-            ConsumptionHistory.created_at >= start_date,
-            ConsumptionHistory.created_at <= end_date,
+        rollup_filters += [
+            UserDailyRollup.day >= start_date,
+            UserDailyRollup.day <= end_date,
+        ]
+        rows = (
+            db.query(UserDailyRollup.day, UserDailyRollup.consumed_count, UserDailyRollup.wasted_count)
+            .filter(*rollup_filters)
+            .order_by(UserDailyRollup.day)
+            .all()
         )
-
-    wasted = wasted_query.count()
-
-    # ==========================================================
-    # ⏰ EXPIRÉS
-    # ==========================================================
-    expired = len(
-        [
-            p
-            for p in products
-            if p.expiration_date and p.expiration_date < date.today()
+        daily_trend = [
+            {"day": d.isoformat(), "consumed": c, "wasted": w}
+            for d, c, w in rows
+            if c or w
         ]
-    )
+        consumed = sum(t["consumed"] for t in daily_trend)
+        wasted = sum(t["wasted"] for t in daily_trend)
+    else:
+        consumed, wasted = (
+            db.query(
+                func.coalesce(func.sum(UserDailyRollup.consumed_count), 0),
+                func.coalesce(func.sum(UserDailyRollup.wasted_count), 0),
+            )
+            .filter(*rollup_filters)
+            .one()
+        )
 
     # ==========================================================
     # 📊 TAUX DE GASPILLAGE
@@ -102,45 +104,110 @@ def stats_overview(
     waste_rate = (wasted / total_products * 100) if total_products else 0
 
     # ==========================================================
-    # 📈 TENDANCES JOURNALIÈRES (OPTIONNEL)
+    # 🚀 RÉPONSE FINALE
     # ==========================================================
-    daily_trend = []
+    return {
+        "total": total_products,
+        "consumed": consumed,
+        "wasted": wasted,
+        "expired": expired,
+        "waste_rate": round(waste_rate, 2),
+        "daily_trend": daily_trend,
+    }
 
-    if start_date:
-        history = (
-            db.query(ConsumptionHistory)
-            .filter(
-                ConsumptionHistory.user_id == current_user.id,
-                ConsumptionHistory.created_at >= start_date,
-                ConsumptionHistory.created_at <= end_date,
-            )
-            .all()
-        )
 
-        trend_map = {}
+# ==========================================================
+# 📈 SÉRIES TEMPORELLES (jour / semaine / mois)
+# ==========================================================
+def _bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # lundi (ISO)
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
 
-        for h in history:
-            day = h.created_at.date().isoformat()
 
-            if day not in trend_map:
-                trend_map[day] = {"day": day, "consumed": 0, "wasted": 0}
+def _next_bucket(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
 
-            if h.action == "consumed":
-                trend_map[day]["consumed"] += 1
-            elif h.action == "wasted":
-                trend_map[day]["wasted"] += 1
 
-        # Tri chronologique
-        daily_trend = sorted(trend_map.values(), key=lambda x: x["day"])
+@router.get("/timeseries")
+def stats_timeseries(
+    start: date = Query(..., description="Premier jour inclus (YYYY-MM-DD)"),
+    end: date = Query(..., description="Dernier jour inclus (YYYY-MM-DD)"),
+    granularity: Literal["day", "week", "month"] = Query("day"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Consommés / gaspillés sur une période arbitraire, regroupés par jour,
+    semaine (lundi) ou mois. Les tableaux sont denses : un point par
+    intervalle, à 0 quand il n'y a eu aucune action.
+    Une seule requête sur user_daily_rollup (au plus une ligne par jour).
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="La date de fin doit être postérieure au début.")
+
+    # ----------------------------
+    # Intervalles (dense)
+    # ----------------------------
+    buckets = []
+    cursor = _bucket_start(start, granularity)
+    while cursor <= end:
+        buckets.append(cursor)
+        if len(buckets) > MAX_SERIES_POINTS:
+            raise HTTPException(
+                status_code=400,
+                detail="Période trop longue pour cette granularité.",
+            )
+        cursor = _next_bucket(cursor, granularity)
+    index = {b: i for i, b in enumerate(buckets)}
+
+    consumed = [0] * len(buckets)
+    wasted = [0] * len(buckets)
+    consumed_amount = [0.0] * len(buckets)
+    wasted_amount = [0.0] * len(buckets)
+
+    # ----------------------------
+    # Lecture du rollup
+    # ----------------------------
+    rows = (
+        db.query(
+            UserDailyRollup.day,
+            UserDailyRollup.consumed_count,
+            UserDailyRollup.wasted_count,
+            UserDailyRollup.consumed_amount,
+            UserDailyRollup.wasted_amount,
+        )
+        .filter(
+            UserDailyRollup.user_id == current_user.id,
+            UserDailyRollup.day >= start,
+            UserDailyRollup.day <= end,
+        )
+        .all()
+    )
+    for day, c, w, ca, wa in rows:
+        i = index[_bucket_start(day, granularity)]
+        consumed[i] += c
+        wasted[i] += w
+        consumed_amount[i] += float(ca or 0)
+        wasted_amount[i] += float(wa or 0)
 
-    # ==========================================================
-    # 🚀 RÉPONSE FINALE
-    # ==========================================================
     return {
-        "total": total_products,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "buckets": [b.isoformat() for b in buckets],
         "consumed": consumed,
         "wasted": wasted,
-        "expired": expired,
-        "waste_rate": round(waste_rate, 2),
-        "daily_trend": daily_trend,
+        "consumed_amount": [round(v, 3) for v in consumed_amount],
+        "wasted_amount": [round(v, 3) for v in wasted_amount],
+        "waste_rate": [
+            round(w / (c + w) * 100, 2) if (c + w) else 0
+            for c, w in zip(consumed, wasted)
+        ],
     }
@@ -1,6 +1,7 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+import os
 import uuid
 
 from .database import get_db
@@ -10,6 +11,11 @@ from sqlalchemy.orm import Session
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
+# Comptes administrateurs (emails séparés par des virgules)
+ADMIN_EMAILS = {
+    e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()
+}
+
 
 def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -39,4 +45,14 @@ def get_current_user(
     return user
 def get_db():
     from .security import get_db as security_get_db  # 👈 IMPORTATION CIRCULAIRE
-    return security_get_db()  # 👈 APPEL DE LA FONCTION
\ No newline at end of file
+    return security_get_db()  # 👈 APPEL DE LA FONCTION
+
+
+def get_current_admin(current_user=Depends(get_current_user)):
+    """Utilisateur connecté ET listé dans ADMIN_EMAILS, sinon 403."""
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès réservé aux administrateurs",
+        )
+    return current_user
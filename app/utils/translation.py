@@ -1,4 +1,4 @@
-import requests
+from app.api_clients.http import http_session
 
 def translate_text(text: str, source_lang="en", target_lang="fr"):
     """
@@ -7,7 +7,7 @@ def translate_text(text: str, source_lang="en", target_lang="fr"):
     if not text:
         return ""
     try:
-        response = requests.post(
+        response = http_session.post(
             "https://libretranslate.com/translate",
             data={
                 "q": text,
@@ -0,0 +1,105 @@
+import json
+import uuid
+from datetime import date
+
+import pytest
+
+from app import models
+from tests.database_test import TestingSessionLocal
+
+
+def _seed_users(prefix):
+    """3 utilisateurs : 0 %, 50 % et 100 % de gaspillage."""
+    db = TestingSessionLocal()
+    try:
+        for i, (consumed, wasted) in enumerate([(2, 0), (1, 1), (0, 3)]):
+            user = models.User(email=f"{prefix}{i}@admin.test", hashed_password="x")
+            db.add(user)
+            db.flush()
+            db.add(models.Product(user_id=user.id, name="p", quantity=1, expiration_date=date(2030, 1, 1)))
+            for action, n in (("consumed", consumed), ("wasted", wasted)):
+                for _ in range(n):
+                    db.add(models.ConsumptionHistory(user_id=user.id, action=action, amount=1))
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def seeded_prefix():
+    """Préfixe d'email unique ; les produits semés sont supprimés ensuite (refresh)."""
+    prefix = f"adm-{uuid.uuid4().hex[:8]}-"
+    _seed_users(prefix)
+    yield prefix
+    db = TestingSessionLocal()
+    try:
+        user_ids = db.query(models.User.id).filter(models.User.email.startswith(prefix))
+        db.query(models.Product).filter(models.Product.user_id.in_(user_ids.scalar_subquery())).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_admin_users_single_query_with_keyset_pages(client, auth_headers, seeded_prefix):
+    prefix = seeded_prefix
+
+    response = client.get(
+        "/admin/users",
+        params={"email_prefix": prefix, "sort": "waste_rate", "order": "desc", "limit": 2},
+        headers=auth_headers,
+    )
+    first = response.json()
+    assert [u["waste_rate"] for u in first] == [100.0, 50.0]
+    assert first[1]["consumed"] == 1 and first[1]["wasted"] == 1 and first[1]["product_count"] == 1
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(
+        "/admin/users",
+        params={"email_prefix": prefix, "sort": "waste_rate", "order": "desc", "limit": 2, "cursor": cursor},
+        headers=auth_headers,
+    )
+    assert [u["email"] for u in response.json()] == [f"{prefix}0@admin.test"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_admin_users_without_limit_returns_everyone(client, auth_headers, seeded_prefix):
+    response = client.get("/admin/users", params={"email_prefix": seeded_prefix}, headers=auth_headers)
+    assert len(response.json()) == 3
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_admin_users_prefix_is_literal(client, auth_headers):
+    response = client.get("/admin/users", params={"email_prefix": "%"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_admin_export_requires_admin(client, auth_headers, monkeypatch):
+    from app import security
+
+    monkeypatch.setattr(security, "ADMIN_EMAILS", set())
+    response = client.get("/admin/users/export", headers=auth_headers)
+    assert response.status_code == 403
+
+
+def test_admin_export_streams_csv_and_ndjson(client, auth_headers, seeded_prefix, monkeypatch):
+    from app import security
+
+    monkeypatch.setattr(security, "ADMIN_EMAILS", {"test@test.com"})
+    prefix = seeded_prefix
+
+    response = client.get("/admin/users/export", params={"email_prefix": prefix}, headers=auth_headers)
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("id,email,")
+    assert len(lines) == 4
+
+    response = client.get(
+        "/admin/users/export",
+        params={"email_prefix": prefix, "format": "ndjson"},
+        headers=auth_headers,
+    )
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(r["waste_rate"] for r in rows) == [0.0, 50.0, 100.0]
@@ -0,0 +1,46 @@
+import uuid
+from datetime import date, timedelta
+
+from app import models
+from app.ml.predictor import AT_RISK, EXPIRED, MESSAGES, SAFE
+from tests.database_test import TestingSessionLocal
+
+
+def test_alerts_window_order_and_category_name(client):
+    today = date.today()
+    email = f"alerts-{uuid.uuid4().hex[:12]}@example.com"
+    client.post("/users/register", json={"email": email, "password": "password123"})
+    token = client.post("/users/login", data={"username": email, "password": "password123"}).json()["access_token"]
+
+    db = TestingSessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == email).one()
+        category = models.Category(name=f"Frais-{uuid.uuid4()}")
+        db.add(category)
+        db.flush()
+        for name, days, category_id in [("demain", 1, category.id), ("loin", 10, None),
+                                        ("perime", -1, None), ("limite", 2, None)]:
+            # Message stocké obsolète (calculé quand le produit était loin de sa date)
+            db.add(models.Product(user_id=user.id, name=name, quantity=1, category_id=category_id,
+                                  expiration_date=today + timedelta(days=days), message=MESSAGES[SAFE]))
+        db.commit()
+        category_name = category.name
+        user_id = user.id
+    finally:
+        db.close()
+
+    try:
+        alerts = client.get("/alerts/", headers={"Authorization": f"Bearer {token}"}).json()
+
+        assert [a["name"] for a in alerts] == ["perime", "demain", "limite"]
+        assert [a["days_left"] for a in alerts] == [-1, 1, 2]
+        assert [a["message"] for a in alerts] == [MESSAGES[EXPIRED], MESSAGES[AT_RISK], MESSAGES[AT_RISK]]
+        assert alerts[1]["category"] == category_name
+        assert alerts[0]["category"] is None
+    finally:
+        db = TestingSessionLocal()
+        try:
+            db.query(models.Product).filter(models.Product.user_id == user_id).delete()
+            db.commit()
+        finally:
+            db.close()
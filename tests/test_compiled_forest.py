@@ -0,0 +1,60 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from app.ml.compiled_forest import CompiledForest
+from app.ml.prediction_table import PredictionTable
+from app.ml.test import generate_fake_dataset
+
+
+def _fit(X, y):
+    model = RandomForestClassifier(n_estimators=25, random_state=0)
+    model.fit(X, y)
+    return model
+
+
+def test_compiled_forest_matches_sklearn():
+    df = generate_fake_dataset(400)
+    X = df[["quantity", "days_to_expire"]].to_numpy(dtype=float)
+    model = _fit(X, df["is_wasted"].to_numpy())
+
+    compiled = CompiledForest.from_sklearn(model)
+
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X))
+    # Une seule ligne (1D ou 2D)
+    assert compiled.predict(X[0])[0] == model.predict(X[:1])[0]
+
+
+def test_compiled_forest_matches_sklearn_on_deep_trees():
+    df = generate_fake_dataset(400)
+    X = df[["quantity", "days_to_expire"]].to_numpy(dtype=float)
+    # Labels bruités → arbres profonds
+    y = np.random.RandomState(0).randint(0, 2, len(X))
+    model = _fit(X, y)
+
+    compiled = CompiledForest.from_sklearn(model)
+    grid = np.column_stack([np.random.RandomState(1).uniform(0, 12, 500),
+                            np.random.RandomState(2).randint(-20, 40, 500)])
+
+    np.testing.assert_array_equal(compiled.predict(grid), model.predict(grid))
+    np.testing.assert_allclose(compiled.predict_proba(grid), model.predict_proba(grid))
+
+
+def test_prediction_table_matches_sklearn():
+    df = generate_fake_dataset(400)
+    X = df[["quantity", "days_to_expire"]].to_numpy(dtype=float)
+    y = np.random.RandomState(0).randint(0, 2, len(X))
+    model = _fit(X, y)
+
+    table = PredictionTable.build(model, CompiledForest.from_sklearn(model), max_days=30)
+    rng = np.random.RandomState(3)
+    quantities = np.concatenate([rng.uniform(0, 12, 300), X[:, 0]])
+    days = np.concatenate([rng.randint(-5, 40, 300), X[:, 1]])
+
+    preds, hit = table.lookup(quantities, days)
+    expected = model.predict(np.column_stack([quantities, days]))
+
+    np.testing.assert_array_equal(preds[hit], expected[hit])
+    # Hors grille (days_left < 0 ou > 30) → miss
+    np.testing.assert_array_equal(hit, (days >= 0) & (days <= 30))
+    assert table.stats()["hits"] == int(hit.sum())
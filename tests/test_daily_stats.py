@@ -0,0 +1,54 @@
+import uuid
+from datetime import date, timedelta
+
+from app import models
+from app.daily_stats import record_daily_stats, backfill_daily_stats
+from tests.database_test import TestingSessionLocal
+
+
+def test_daily_stats_breakdowns_match_global_row():
+    db = TestingSessionLocal()
+    today = date.today()
+    try:
+        category = models.Category(name=f"cat-{uuid.uuid4()}")
+        user = models.User(email=f"{uuid.uuid4()}@stats.test", hashed_password="x")
+        db.add_all([category, user])
+        db.flush()
+
+        for days, category_id in [(-1, category.id), (1, category.id), (30, None), (60, category.id)]:
+            db.add(models.Product(
+                user_id=user.id, name="p", quantity=1, category_id=category_id,
+                expiration_date=today + timedelta(days=days),
+            ))
+        db.commit()
+
+        result = record_daily_stats(db, today)
+        per_user = db.get(models.DailyUserStats, (today, user.id))
+        assert (per_user.total_products, per_user.expired, per_user.risky, per_user.safe) == (4, 1, 1, 2)
+
+        per_category = (
+            db.query(models.DailyCategoryStats)
+            .filter_by(stat_date=today, category_id=category.id)
+            .one()
+        )
+        assert (per_category.expired, per_category.risky, per_category.safe) == (1, 1, 1)
+
+        overall = db.query(models.DailyStats).filter_by(stat_date=today).one()
+        assert overall.total_products == result["total"]
+        assert overall.expired + overall.risky + overall.safe == overall.total_products
+        by_user_total = sum(r.total_products for r in db.query(models.DailyUserStats).filter_by(stat_date=today))
+        assert by_user_total == overall.total_products
+
+        # Rejouable : les ventilations du jour sont remplacées
+        record_daily_stats(db, today)
+        assert db.query(models.DailyUserStats).filter_by(stat_date=today, user_id=user.id).count() == 1
+
+        # Backfill : un jour avant la création des produits, rien à compter pour cet utilisateur
+        backfill_daily_stats(db, today - timedelta(days=2), today - timedelta(days=1))
+        assert db.get(models.DailyUserStats, (today - timedelta(days=1), user.id)) is None
+
+        # Ne pas laisser de produits obsolètes aux autres tests (refresh)
+        db.query(models.Product).filter_by(user_id=user.id).delete()
+        db.commit()
+    finally:
+        db.close()
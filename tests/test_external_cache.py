@@ -0,0 +1,100 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.api_clients.cache import cached_fetch, CACHE_TTLS
+from tests.database_test import TestingSessionLocal
+
+
+def _counting(value):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return value
+    return fetch, calls
+
+
+def test_miss_then_hit_with_normalized_key():
+    db = TestingSessionLocal()
+    try:
+        key = f"Lait {uuid.uuid4()}"
+        fetch, calls = _counting({"grade": "a"})
+
+        assert cached_fetch(db, "off_search", key, fetch) == {"grade": "a"}
+        assert cached_fetch(db, "off_search", f"  {key.upper()} ", fetch) == {"grade": "a"}
+        assert len(calls) == 1
+    finally:
+        db.close()
+
+
+def test_errors_are_not_cached():
+    db = TestingSessionLocal()
+    try:
+        key = str(uuid.uuid4())
+
+        def failing():
+            raise ConnectionError("down")
+
+        assert cached_fetch(db, "off_search", key, failing, default=[]) == []
+        assert db.get(models.ExternalCache, ("off_search", key)) is None
+    finally:
+        db.close()
+
+
+def test_cache_write_failure_still_returns_the_value(monkeypatch):
+    from sqlalchemy.exc import OperationalError
+
+    from app.api_clients import cache
+
+    def broken_store(db, source, key, value):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(cache, "_store", broken_store)
+    db = TestingSessionLocal()
+    try:
+        fetch, _ = _counting({"grade": "b"})
+        assert cached_fetch(db, "off_search", str(uuid.uuid4()), fetch) == {"grade": "b"}
+        # Session toujours utilisable après le rollback
+        assert db.query(models.ExternalCache).limit(1).all() is not None
+    finally:
+        db.close()
+
+
+def test_stale_entry_is_served_then_refreshed_in_background():
+    db = TestingSessionLocal()
+    try:
+        key = str(uuid.uuid4())
+        old = datetime.now(timezone.utc) - timedelta(seconds=CACHE_TTLS["mealdb_search"] + 60)
+        db.add(models.ExternalCache(source="mealdb_search", key=key, value=["ancienne"], fetched_at=old))
+        db.commit()
+
+        fetch, calls = _counting(["nouvelle"])
+        assert cached_fetch(db, "mealdb_search", key, fetch) == ["ancienne"]
+
+        for _ in range(100):
+            db.expire_all()
+            if db.get(models.ExternalCache, ("mealdb_search", key)).value == ["nouvelle"]:
+                break
+            time.sleep(0.02)
+        assert cached_fetch(db, "mealdb_search", key, fetch) == ["nouvelle"]
+        assert len(calls) == 1
+    finally:
+        db.close()
+
+
+def test_barcode_route_separates_unknown_from_unavailable(client, monkeypatch):
+    from app.routers import barcode
+
+    code = str(uuid.uuid4().int)[:13]
+    monkeypatch.setattr(barcode, "fetch_barcode", lambda c: None)
+    assert client.get(f"/barcode/{code}").status_code == 404
+
+    def down(c):
+        raise ConnectionError("down")
+
+    # API injoignable : l'inconnu en cache reste un 404, le reste est un 503 réessayable
+    monkeypatch.setattr(barcode, "fetch_barcode", down)
+    assert client.get(f"/barcode/{code}").status_code == 404
+    assert client.get(f"/barcode/{str(uuid.uuid4().int)[:13]}").status_code == 503
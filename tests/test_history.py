@@ -0,0 +1,109 @@
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+from app import models
+from app.routers.products import history_entry
+from tests.database_test import TestingSessionLocal
+
+
+@pytest.fixture
+def history_user(client):
+    """Utilisateur propre au test, avec 5 lignes d'historique ; nettoyé ensuite."""
+    email = f"history-{uuid.uuid4().hex[:12]}@example.com"
+    client.post("/users/register", json={"email": email, "password": "password123"})
+    token = client.post("/users/login", data={"username": email, "password": "password123"}).json()["access_token"]
+
+    db = TestingSessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == email).one()
+        product = models.Product(user_id=user.id, name="Yaourt", quantity=1, expiration_date=date(2030, 1, 1))
+        db.add(product)
+        db.flush()
+        for day in range(1, 6):
+            db.add(models.ConsumptionHistory(
+                user_id=user.id,
+                product_id=product.id if day % 2 else None,
+                product_name="Yaourt" if day % 2 else None,
+                action="wasted" if day == 3 else "consumed",
+                amount=day,
+                created_at=datetime(2026, 2, day, 12),
+            ))
+        db.commit()
+        user_id = user.id
+    finally:
+        db.close()
+
+    yield {"Authorization": f"Bearer {token}"}
+
+    db = TestingSessionLocal()
+    try:
+        db.query(models.ConsumptionHistory).filter(models.ConsumptionHistory.user_id == user_id).delete()
+        db.query(models.Product).filter(models.Product.user_id == user_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_history_pages_by_cursor_with_product_names(client, history_user):
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/history/", params=params, headers=history_user)
+        seen += response.json()
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert [r["amount"] for r in seen] == [5, 4, 3, 2, 1]
+    assert [r["product_name"] for r in seen[:2]] == ["Yaourt", "Produit supprimé"]
+
+
+def test_history_filters(client, history_user):
+    wasted = client.get("/history/", params={"action": "wasted"}, headers=history_user).json()
+    assert [r["amount"] for r in wasted] == [3]
+
+    ranged = client.get(
+        "/history/", params={"start": "2026-02-02", "end": "2026-02-03"}, headers=history_user
+    ).json()
+    assert [r["amount"] for r in ranged] == [3, 2]
+
+
+def test_history_rows_without_snapshot_fall_back_to_product(client, history_user):
+    user_id = uuid.UUID(client.get("/users/me", headers=history_user).json()["id"])
+    db = TestingSessionLocal()
+    try:
+        product = db.query(models.Product).filter(models.Product.user_id == user_id).one()
+        # Ligne d'avant la copie des noms, produit toujours là
+        db.add(models.ConsumptionHistory(user_id=product.user_id, product_id=product.id,
+                                         action="consumed", amount=6, created_at=datetime(2026, 2, 6, 12)))
+        db.commit()
+    finally:
+        db.close()
+
+    newest = client.get("/history/", params={"limit": 1}, headers=history_user).json()[0]
+    assert (newest["amount"], newest["product_name"]) == (6, "Yaourt")
+
+
+def test_history_entry_snapshots_product_and_category():
+    db = TestingSessionLocal()
+    try:
+        category = models.Category(name=f"Laitiers-{uuid.uuid4()}")
+        user = models.User(email=f"{uuid.uuid4()}@history.test", hashed_password="x")
+        db.add_all([category, user])
+        db.flush()
+        product = models.Product(user_id=user.id, name="Lait", quantity=1,
+                                 category_id=category.id, expiration_date=date(2030, 1, 1))
+        db.add(product)
+        db.flush()
+
+        entry = history_entry(user.id, product, "consumed", 1)
+        db.add(entry)
+        db.delete(product)
+        db.commit()
+
+        db.refresh(entry)
+        assert (entry.product_name, entry.category_name) == ("Lait", category.name)
+    finally:
+        db.close()
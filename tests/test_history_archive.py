@@ -0,0 +1,43 @@
+import uuid
+from datetime import date, datetime
+
+from app import models
+from app.history_archive import archive_history
+from tests.database_test import TestingSessionLocal
+
+
+def test_archive_compacts_old_months_and_keeps_recent_rows():
+    db = TestingSessionLocal()
+    try:
+        user = models.User(email=f"{uuid.uuid4()}@archive.test", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for created_at, action, amount in [
+            (datetime(2020, 1, 3, 10), "consumed", 1),
+            (datetime(2020, 1, 20, 10), "wasted", 2),
+            (datetime(2020, 2, 1, 0), "wasted", 1),
+            (datetime(2026, 9, 30, 12), "consumed", 4),
+        ]:
+            db.add(models.ConsumptionHistory(user_id=user.id, action=action, amount=amount, created_at=created_at))
+        db.commit()
+
+        result = archive_history(db, retention_months=2, today=date(2026, 10, 18))
+        assert result["cutoff"] == "2026-09-01"
+
+        months = {
+            m.month: m
+            for m in db.query(models.ConsumptionHistoryMonthly).filter_by(user_id=user.id)
+        }
+        assert set(months) == {date(2020, 1, 1), date(2020, 2, 1)}
+        january = months[date(2020, 1, 1)]
+        assert (january.consumed_count, january.wasted_count) == (1, 1)
+        assert (float(january.consumed_amount), float(january.wasted_amount)) == (1, 2)
+
+        remaining = db.query(models.ConsumptionHistory).filter_by(user_id=user.id).all()
+        assert [float(r.amount) for r in remaining] == [4]
+
+        # Rejouable : rien de plus à compacter
+        archive_history(db, retention_months=2, today=date(2026, 10, 18))
+        assert db.get(models.ConsumptionHistoryMonthly, (user.id, date(2020, 1, 1))).wasted_count == 1
+    finally:
+        db.close()
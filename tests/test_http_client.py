@@ -0,0 +1,43 @@
+import threading
+import time
+
+from app.api_clients.http import fan_out, http_session, HTTP_POOL_MAXSIZE
+
+
+def test_fan_out_runs_calls_concurrently():
+    def slow(value):
+        time.sleep(0.2)
+        return value
+
+    started = time.perf_counter()
+    results = fan_out({"a": lambda: slow(1), "b": lambda: slow(2)})
+    elapsed = time.perf_counter() - started
+
+    assert results == {"a": 1, "b": 2}
+    assert elapsed < 0.35
+
+
+def test_shared_session_is_pooled():
+    adapter = http_session.get_adapter("https://world.openfoodfacts.org")
+    assert adapter._pool_maxsize == HTTP_POOL_MAXSIZE
+    assert http_session.get_adapter("https://www.themealdb.com") is adapter
+
+
+def test_fan_out_limit_bounds_concurrency():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call(i):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return i
+
+    results = fan_out({str(i): (lambda i=i: call(i)) for i in range(6)}, limit=2)
+
+    assert list(results) == [str(i) for i in range(6)]
+    assert list(results.values()) == list(range(6))
+    assert peak[0] <= 2
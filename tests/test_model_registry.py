@@ -0,0 +1,147 @@
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import RandomForestClassifier
+
+from app.ml.registry import ModelRegistry
+from app.ml.store import ModelStore
+
+
+def _dummy(constant):
+    model = DummyClassifier(strategy="constant", constant=constant)
+    model.fit([[1, 1], [2, 2]], [0, 1])
+    return model
+
+
+def _dump(path, constant):
+    joblib.dump(_dummy(constant), path)
+
+
+def test_registry_loads_once_and_hot_reloads(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    _dump(path, 0)
+
+    registry = ModelRegistry(path, check_interval=0, background_reload=False)
+    first = registry.get()
+    assert first.model.predict([[1, 1]])[0] == 0
+    assert registry.get() is first
+
+    _dump(path, 1)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+    second = registry.get()
+    assert second is not first
+    assert second.version != first.version
+    assert second.model.predict([[1, 1]])[0] == 1
+    assert registry.info()["version"] == second.version
+
+
+def test_background_reload_keeps_serving_old_model(tmp_path):
+    path = str(tmp_path / "model.joblib")
+    _dump(path, 0)
+    registry = ModelRegistry(path, check_interval=0)
+    first = registry.get()
+
+    _dump(path, 1)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+    # Le rechargement part en tâche de fond puis remplace l'ancien modèle
+    for _ in range(100):
+        if registry.get() is not first:
+            break
+        time.sleep(0.02)
+    assert registry.get().model.predict([[1, 1]])[0] == 1
+
+
+def test_store_promotion_and_shadow(tmp_path):
+    legacy = str(tmp_path / "legacy.joblib")
+    _dump(legacy, 0)
+    store = ModelStore(str(tmp_path / "store"))
+    registry = ModelRegistry(legacy, store=store, check_interval=0, background_reload=False)
+    assert registry.get().path == legacy
+
+    X = np.column_stack([np.linspace(1, 10, 50), np.arange(50)])
+    forest = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, np.arange(50) % 2)
+    v1 = store.save(forest, metrics={"accuracy": 1.0})
+    v2 = store.save(_dummy(1))
+    assert v1 != v2 and registry.get().path == legacy
+
+    # Promotion : préchauffage puis installation
+    loaded = registry.load_version(v1)
+    assert loaded.compiled is not None and loaded.table is not None
+    store.promote(v1)
+    registry.install(loaded)
+    assert registry.get() is loaded
+    assert registry.info()["version"] == v1
+
+    store.set_shadow(v2, sample_rate=1.0)
+    shadow, rate = registry.shadow()
+    assert shadow.version == v2 and rate == 1.0
+
+    store.set_shadow(None)
+    assert registry.shadow() == (None, 0.0)
+
+
+def _is_mapped(arr):
+    return isinstance(arr, np.memmap) or isinstance(arr.base, np.memmap)
+
+
+def test_store_artifacts_are_memory_mapped(tmp_path):
+    store = ModelStore(str(tmp_path / "store"))
+    X = np.column_stack([np.linspace(1, 10, 50), np.arange(50)])
+    forest = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, np.arange(50) % 2)
+    version = store.save(forest)
+
+    registry = ModelRegistry(str(tmp_path / "none.joblib"), store=store)
+    loaded = registry.load_version(version)
+
+    assert _is_mapped(loaded.compiled.threshold)
+    assert _is_mapped(loaded.table.table)
+    # Les .npy suffisent : le modèle sklearn (copie privée) n'est pas chargé
+    assert not loaded.model.loaded
+    np.testing.assert_array_equal(loaded.predict(X), forest.predict(X))
+    assert not loaded.model.loaded
+    assert "delta" in loaded.memory
+
+    # Lot trop gros pour la forêt compilée, hors table : chargé à la demande
+    big = np.column_stack([np.full(300, 5.0), np.arange(100, 400)])
+    np.testing.assert_array_equal(loaded.predict(big), forest.predict(big))
+    assert loaded.model.loaded
+
+
+def test_shadow_scoring_drops_samples_when_busy(monkeypatch):
+    import threading
+    from types import SimpleNamespace
+
+    from app.ml import shadow as shadow_module
+
+    release = threading.Event()
+    scored = []
+
+    def slow_predict(X):
+        release.wait(2)
+        scored.append(len(X))
+        return np.zeros(len(X))
+
+    busy = SimpleNamespace(version="busy-shadow", predict=slow_predict)
+    monkeypatch.setattr(shadow_module.model_registry, "shadow", lambda: (busy, 1.0))
+    dropped = shadow_module.SHADOW_DROPPED.labels(shadow_version="busy-shadow")
+    before = dropped._value.get()
+
+    X = np.ones((3, 2))
+    extra = 5
+    for _ in range(shadow_module.SHADOW_MAX_PENDING + extra):
+        shadow_module.observe_prediction(X, np.zeros(3), 0.001)
+
+    assert dropped._value.get() - before == extra
+    release.set()
+    for _ in range(100):
+        if len(scored) == shadow_module.SHADOW_MAX_PENDING:
+            break
+        time.sleep(0.02)
+    assert len(scored) == shadow_module.SHADOW_MAX_PENDING
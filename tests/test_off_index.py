@@ -0,0 +1,129 @@
+import gzip
+import json
+import uuid
+
+from app import models
+from app.api_clients.off_index import import_dump, lookup
+from tests.database_test import TestingSessionLocal
+
+
+def test_import_jsonl_dump_and_lookup(tmp_path):
+    code = str(uuid.uuid4().int)[:12]
+    path = tmp_path / "products.jsonl.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"code": code.zfill(13), "product_name": "Lait", "brands": "Ferme",
+                            "nutriscore_grade": "B", "image_front_url": "http://img/1.jpg"}) + "\n")
+        f.write("pas du json\n")
+        f.write(json.dumps({"product_name": "sans code"}) + "\n")
+        # Doublon dans le même lot : la dernière version gagne
+        f.write(json.dumps({"code": code.zfill(13), "product_name": "Lait entier",
+                            "nutriscore_grade": "unknown"}) + "\n")
+
+    db = TestingSessionLocal()
+    try:
+        assert import_dump(db, str(path), batch_size=10) == 2
+
+        # Code UPC-A (12 chiffres) retrouvé sous sa forme EAN-13
+        product = lookup(db, code)
+        assert product["name"] == "Lait entier" and product["nutriscore"] is None
+        assert lookup(db, "0000000000000") is None
+    finally:
+        db.close()
+
+
+def test_import_tab_separated_export(tmp_path):
+    code = str(uuid.uuid4().int)[:13]
+    path = tmp_path / "products.csv"
+    path.write_text(
+        "code\tproduct_name\tbrands\tcategories\timage_url\tnutriscore_grade\n"
+        f"{code}\tYaourt\tLaiterie\tDairies\thttp://img/2.jpg\ta\n",
+        encoding="utf-8",
+    )
+
+    db = TestingSessionLocal()
+    try:
+        assert import_dump(db, str(path)) == 1
+        row = db.get(models.OffProduct, code)
+        assert (row.name, row.categories, row.nutriscore) == ("Yaourt", "Dairies", "a")
+    finally:
+        db.close()
+
+
+def test_barcode_route_serves_index_without_network(client):
+    code = str(uuid.uuid4().int)[:13]
+    db = TestingSessionLocal()
+    try:
+        db.add(models.OffProduct(code=code, name="Beurre", brand="Ferme"))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.get(f"/barcode/{code}")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Beurre"
+
+
+def test_barcode_batch_dedupes_and_reports_each_code(client, auth_headers, monkeypatch):
+    from app.routers import barcode
+
+    known = str(uuid.uuid4().int)[:13]
+    db = TestingSessionLocal()
+    try:
+        db.add(models.OffProduct(code=known, name="Beurre"))
+        db.commit()
+    finally:
+        db.close()
+
+    fetched = []
+
+    def fake_fetch(code):
+        fetched.append(code)
+        if code.endswith("1"):
+            return None
+        if code.endswith("2"):
+            raise ConnectionError("down")
+        return {"name": f"live-{code}"}
+
+    monkeypatch.setattr(barcode, "fetch_barcode", fake_fetch)
+    prefix = str(uuid.uuid4().int)[:12]
+    codes = [known, f"{prefix}0", f"{prefix}1", f"{prefix}2", known, f"{prefix}0"]
+
+    body = client.post("/barcode/batch", json={"codes": codes}, headers=auth_headers).json()
+
+    assert [r["barcode"] for r in body["results"]] == [known, f"{prefix}0", f"{prefix}1", f"{prefix}2"]
+    assert [r["status"] for r in body["results"]] == ["ok", "ok", "not_found", "error"]
+    assert body["results"][0]["product"]["name"] == "Beurre"
+    assert sorted(fetched) == [f"{prefix}0", f"{prefix}1", f"{prefix}2"]
+    assert (body["found"], body["missing"]) == (2, 2)
+
+    # Valeurs obtenues écrites dans le cache (pas l'échec) : le lot suivant ne refait que l'échec
+    fetched.clear()
+    body = client.post("/barcode/batch", json={"codes": codes}, headers=auth_headers).json()
+    assert [r["status"] for r in body["results"]] == ["ok", "ok", "not_found", "error"]
+    assert fetched == [f"{prefix}2"]
+
+
+def test_barcode_route_rejects_non_digit_codes(client, monkeypatch):
+    from app.routers import barcode
+
+    def unexpected(code):
+        raise AssertionError(f"appel OpenFoodFacts pour {code!r}")
+
+    monkeypatch.setattr(barcode, "fetch_barcode", unexpected)
+    for code in ["abc", "1234567", "123456789012345", "12345678%3Fx%3D1", "..%2F..%2Fsearch"]:
+        assert client.get(f"/barcode/{code}").status_code in (404, 422), code
+    assert client.get("/barcode/12345678%3Fx%3D1").status_code == 422
+
+
+def test_barcode_batch_requires_login_and_valid_codes(client, auth_headers, monkeypatch):
+    from app.routers import barcode
+
+    def unexpected(code):
+        raise AssertionError(f"appel OpenFoodFacts pour {code!r}")
+
+    monkeypatch.setattr(barcode, "fetch_barcode", unexpected)
+
+    assert client.post("/barcode/batch", json={"codes": ["12345678"]}).status_code == 401
+    for bad in ["12345678/../search", "12345678?x=1", "abc", ""]:
+        response = client.post("/barcode/batch", json={"codes": ["12345678", bad]}, headers=auth_headers)
+        assert response.status_code == 422, bad
@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from app.ml.predictor import get_predictions_and_messages, compute_risk_dates, AT_RISK, EXPIRED, SAFE
+
+
+def _product(quantity, days_left, today):
+    return SimpleNamespace(quantity=quantity, expiration_date=today + timedelta(days=days_left), at_risk_from=None)
+
+
+def test_batch_prediction_keeps_business_rules():
+    today = date(2026, 1, 10)
+    products = [_product(1, -2, today), _product(2, 1, today), _product(3, 20, today)]
+
+    results = get_predictions_and_messages(products, today=today)
+
+    assert [r[0] for r in results] == [-2, 1, 20]
+    assert results[0][1] == EXPIRED
+    assert results[1][1] == AT_RISK
+    assert results[2][1] in (SAFE, AT_RISK)
+
+
+def test_batch_matches_single_row():
+    today = date(2026, 1, 10)
+    products = [_product(q, d, today) for q in (1, 5, 9) for d in range(-1, 12)]
+
+    batch = get_predictions_and_messages(products, today=today)
+    single = [get_predictions_and_messages([p], today=today)[0] for p in products]
+
+    assert batch == single
+
+
+def test_status_is_a_date_comparison_once_risk_date_is_stored():
+    today = date(2026, 1, 10)
+    p = _product(1, 20, today)
+    (p.at_risk_from,), _ = compute_risk_dates([p], today=today)
+
+    # Au plus tard 3 jours avant péremption
+    assert p.at_risk_from <= p.expiration_date - timedelta(days=3)
+
+    for offset in range(0, 25):
+        day = today + timedelta(days=offset)
+        days_left, status, _ = get_predictions_and_messages([p], today=day)[0]
+        if days_left < 0:
+            assert status == EXPIRED
+        elif day >= p.at_risk_from:
+            assert status == AT_RISK
+        else:
+            assert status == SAFE
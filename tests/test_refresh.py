@@ -0,0 +1,93 @@
+import uuid
+from datetime import date, timedelta
+
+from app import models
+from app.ml.refresh import refresh_predictions, run_partitioned_refresh, id_partitions
+from tests.database_test import TestingSessionLocal
+
+
+def test_refresh_only_touches_stale_rows():
+    db = TestingSessionLocal()
+    today = date(2026, 1, 10)
+    user = models.User(email=f"{uuid.uuid4()}@refresh.test", hashed_password="x")
+    try:
+        db.add(user)
+        db.flush()
+
+        for days in (-3, 1, 2, 40, 50):
+            db.add(models.Product(
+                user_id=user.id, name="p", quantity=1,
+                expiration_date=today + timedelta(days=days),
+                prediction=0, message="✅ Produit sûr",
+            ))
+        db.commit()
+
+        ids = sorted(p.id for p in db.query(models.Product).filter(models.Product.user_id == user.id))
+        first = refresh_predictions(db, chunk_size=2, id_from=ids[0], id_to=ids[-1], today=today)
+        # id_to exclusif
+        assert first["scanned"] == 4
+
+        # Base de test partagée : on reste sur la plage d'ids de ce test
+        own = {"id_from": ids[0], "id_to": uuid.UUID(int=ids[-1].int + 1)}
+        refresh_predictions(db, chunk_size=2, today=today, **own)
+        stored = {
+            (p.expiration_date - today).days: p
+            for p in db.query(models.Product).filter(models.Product.user_id == user.id)
+        }
+        assert stored[-3].prediction == 2 and stored[1].prediction == 1 and stored[2].prediction == 1
+        assert stored[40].prediction == 0
+        assert all(p.at_risk_from and p.risk_model_version for p in stored.values())
+
+        # Plus rien d'obsolète : rien n'est relu
+        again = refresh_predictions(db, chunk_size=2, today=today, **own)
+        assert again["scanned"] == 0
+
+        # Recalcul complet : tout est relu, rien ne change
+        full = refresh_predictions(db, chunk_size=2, today=today, full=True, **own)
+        assert full["scanned"] == 5 and full["changed"] == 0
+    finally:
+        db.rollback()
+        db.query(models.Product).filter(models.Product.user_id == user.id).delete()
+        db.commit()
+        db.close()
+
+
+def test_id_partitions_cover_the_uuid_space():
+    parts = id_partitions(4)
+    assert parts[0][0] == uuid.UUID(int=0)
+    assert parts[-1][1] is None
+    assert all(parts[k][1] == parts[k + 1][0] for k in range(3))
+
+
+def test_partitioned_refresh_merges_and_retries_selected_partitions():
+    db = TestingSessionLocal()
+    today = date.today()
+    try:
+        user = models.User(email=f"{uuid.uuid4()}@refresh.test", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for days in range(8):
+            db.add(models.Product(user_id=user.id, name="p", quantity=1,
+                                  expiration_date=today + timedelta(days=days)))
+        db.commit()
+        user_id = user.id
+    finally:
+        db.close()
+
+    try:
+        url = str(TestingSessionLocal.kw["bind"].url)
+        report = run_partitioned_refresh(partitions=4, workers=2, full=True, database_url=url)
+        assert report["failed"] == [] and report["succeeded"] == [0, 1, 2, 3]
+        assert report["scanned"] == sum(p["scanned"] for p in report["by_partition"].values())
+        assert report["scanned"] >= 8
+
+        retry = run_partitioned_refresh(partitions=4, workers=1, only=[2], full=True, database_url=url)
+        assert retry["succeeded"] == [2]
+    finally:
+        # Ne pas laisser de produits aux autres tests (base partagée)
+        db = TestingSessionLocal()
+        try:
+            db.query(models.Product).filter(models.Product.user_id == user_id).delete()
+            db.commit()
+        finally:
+            db.close()
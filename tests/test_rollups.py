@@ -0,0 +1,78 @@
+import uuid
+from datetime import date, datetime
+
+from app import models
+from app.rollups import record_action, backfill_rollups
+from tests.database_test import TestingSessionLocal
+
+
+def _rollup(db, user_id):
+    return {
+        r.day: r
+        for r in db.query(models.UserDailyRollup).filter(models.UserDailyRollup.user_id == user_id)
+    }
+
+
+def test_record_action_upserts_the_daily_row():
+    db = TestingSessionLocal()
+    try:
+        user = models.User(email=f"{uuid.uuid4()}@rollup.test", hashed_password="x")
+        db.add(user)
+        db.flush()
+
+        record_action(db, user.id, "consumed", 2)
+        record_action(db, user.id, "consumed", 1)
+        record_action(db, user.id, "wasted", 0.5)
+        db.commit()
+
+        rows = list(_rollup(db, user.id).values())
+        assert len(rows) == 1
+        assert (rows[0].consumed_count, rows[0].wasted_count) == (2, 1)
+        assert (rows[0].consumed_amount, rows[0].wasted_amount) == (3, 0.5)
+    finally:
+        db.close()
+
+
+def test_backfill_rebuilds_rollup_from_history():
+    db = TestingSessionLocal()
+    try:
+        user = models.User(email=f"{uuid.uuid4()}@rollup.test", hashed_password="x")
+        db.add(user)
+        db.flush()
+
+        for day, action, amount in [
+            (datetime(2026, 3, 1, 8), "consumed", 1),
+            (datetime(2026, 3, 1, 22), "wasted", 2),
+            (datetime(2026, 3, 2, 12), "wasted", 1),
+            (datetime(2026, 4, 1, 12), "consumed", 1),
+        ]:
+            db.add(models.ConsumptionHistory(
+                user_id=user.id, action=action, amount=amount, created_at=day,
+            ))
+        db.commit()
+
+        backfill_rollups(db, since=date(2026, 3, 1), until=date(2026, 3, 31))
+        rows = _rollup(db, user.id)
+        assert set(rows) == {date(2026, 3, 1), date(2026, 3, 2)}
+        assert (rows[date(2026, 3, 1)].consumed_count, rows[date(2026, 3, 1)].wasted_count) == (1, 1)
+        assert rows[date(2026, 3, 2)].wasted_amount == 1
+
+        # Rejouable : les lignes sont écrasées, pas cumulées
+        backfill_rollups(db)
+        rows = _rollup(db, user.id)
+        assert rows[date(2026, 3, 1)].wasted_count == 1
+        assert date(2026, 4, 1) in rows
+
+        # Historique supprimé : le jour disparaît du rollup au backfill suivant
+        db.query(models.ConsumptionHistory).filter(
+            models.ConsumptionHistory.user_id == user.id,
+            models.ConsumptionHistory.amount == 1,
+            models.ConsumptionHistory.action == "wasted",
+        ).delete()
+        db.commit()
+        backfill_rollups(db, since=date(2026, 3, 1), until=date(2026, 3, 31))
+        rows = _rollup(db, user.id)
+        assert date(2026, 3, 2) not in rows
+        assert date(2026, 4, 1) in rows
+    finally:
+        db.close()
@@ -0,0 +1,41 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.api_clients.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def upstream():
+        calls.append(1)
+        release.wait(1)
+        return {"grade": "b"}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, "off_search", "milk", upstream) for _ in range(8)]
+        time.sleep(0.1)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(value == {"grade": "b"} for value, _ in results)
+    assert sum(shared for _, shared in results) == 7
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight()
+
+    def failing():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        flight.do("mealdb_search", "chicken", failing)
+
+    # Appel terminé : le suivant repart vers l'API
+    assert flight.do("mealdb_search", "chicken", lambda: ["ok"]) == (["ok"], False)
@@ -0,0 +1,65 @@
+from datetime import date
+
+from app import models
+from tests.database_test import TestingSessionLocal
+
+
+def _seed_rollup(email, rows):
+    db = TestingSessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == email).one()
+        db.query(models.UserDailyRollup).filter(models.UserDailyRollup.user_id == user.id).delete()
+        for day, consumed, wasted in rows:
+            db.add(models.UserDailyRollup(
+                user_id=user.id, day=day,
+                consumed_count=consumed, wasted_count=wasted,
+                consumed_amount=consumed, wasted_amount=wasted,
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_timeseries_is_dense_and_bucketed(client, auth_headers):
+    _seed_rollup("test@test.com", [
+        (date(2026, 1, 5), 2, 1),   # lundi
+        (date(2026, 1, 7), 1, 0),
+        (date(2026, 1, 20), 0, 3),
+        (date(2026, 3, 2), 1, 1),
+    ])
+
+    daily = client.get(
+        "/stats/timeseries",
+        params={"start": "2026-01-05", "end": "2026-01-08"},
+        headers=auth_headers,
+    ).json()
+    assert daily["buckets"] == ["2026-01-05", "2026-01-06", "2026-01-07", "2026-01-08"]
+    assert daily["consumed"] == [2, 0, 1, 0]
+    assert daily["wasted"] == [1, 0, 0, 0]
+
+    weekly = client.get(
+        "/stats/timeseries",
+        params={"start": "2026-01-01", "end": "2026-01-21", "granularity": "week"},
+        headers=auth_headers,
+    ).json()
+    assert weekly["buckets"] == ["2025-12-29", "2026-01-05", "2026-01-12", "2026-01-19"]
+    assert weekly["consumed"] == [0, 3, 0, 0]
+    assert weekly["wasted"] == [0, 1, 0, 3]
+
+    monthly = client.get(
+        "/stats/timeseries",
+        params={"start": "2026-01-01", "end": "2026-03-31", "granularity": "month"},
+        headers=auth_headers,
+    ).json()
+    assert monthly["buckets"] == ["2026-01-01", "2026-02-01", "2026-03-01"]
+    assert monthly["wasted"] == [4, 0, 1]
+    assert monthly["waste_rate"][1] == 0
+
+
+def test_timeseries_rejects_inverted_range(client, auth_headers):
+    response = client.get(
+        "/stats/timeseries",
+        params={"start": "2026-02-01", "end": "2026-01-01"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
@@ -0,0 +1,40 @@
+import uuid
+from datetime import date, datetime, timedelta
+
+from app import models
+from app.ml.data_preparation import write_snapshot, load_snapshot
+from tests.database_test import TestingSessionLocal, engine_test
+
+
+def test_snapshot_uses_real_history_labels(tmp_path):
+    # Quantités propres à ce test : la base de test est partagée
+    quantity = 1000 + uuid.uuid4().int % 1000 + 0.5
+    today = datetime.combine(date.today(), datetime.min.time())
+    db = TestingSessionLocal()
+    try:
+        user = models.User(email=f"{uuid.uuid4()}@train.test", hashed_password="x")
+        db.add(user)
+        db.flush()
+        expiration = date.today() + timedelta(days=5)
+        db.add_all([
+            models.ConsumptionHistory(user_id=user.id, action="consumed", amount=1, created_at=today,
+                                      product_quantity=quantity, product_expiration_date=expiration),
+            # Produit supprimé depuis (dernière action qui l'a vidé) : conservé
+            models.ConsumptionHistory(user_id=user.id, product_id=None, action="wasted", amount=2,
+                                      created_at=today, product_quantity=quantity + 1,
+                                      product_expiration_date=expiration),
+            # Ligne antérieure aux copies de features : ignorée
+            models.ConsumptionHistory(user_id=user.id, action="wasted", amount=quantity + 2, created_at=today),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+    out = write_snapshot(engine_test, out_dir=str(tmp_path / "snap"), chunk_size=1)
+    X, y = load_snapshot(out)
+
+    assert X.shape[1] == 2 and len(X) == len(y) >= 2
+    rows = {(float(q), float(days), int(label)) for (q, days), label in zip(X, y)}
+    assert (quantity, 5.0, 0) in rows and (quantity + 1, 5.0, 1) in rows
+    assert not any(q == quantity + 2 for q, _, _ in rows)
+    assert not (tmp_path / "snap" / "X.bin").exists()